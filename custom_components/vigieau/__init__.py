@@ -1,10 +1,15 @@
 import os
 import re
 import json
+import asyncio
+import hashlib
+import heapq
 import urllib.parse
 import logging
-from datetime import timedelta, time as dt_time
+from datetime import datetime, timedelta, time as dt_time
 from dateutil import tz
+from bisect import bisect_right
+from functools import lru_cache
 from itertools import dropwhile, takewhile
 from typing import Any, Dict, Optional, Tuple
 from zoneinfo import ZoneInfo
@@ -16,9 +21,10 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import (
     CONF_LATITUDE,
     CONF_LONGITUDE,
+    EVENT_CORE_CONFIG_UPDATE,
     Platform,
 )
-from homeassistant.core import HomeAssistant, callback
+from homeassistant.core import Event, HomeAssistant, callback
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.entity import EntityCategory, DeviceInfo
 from homeassistant.helpers.device_registry import DeviceEntryType
@@ -29,27 +35,37 @@ from homeassistant.helpers.update_coordinator import (
     UpdateFailed,
 )
 from homeassistant.helpers.storage import Store
-from homeassistant.helpers.event import async_track_point_in_time
+from homeassistant.helpers.event import async_track_point_in_time, async_track_state_change_event
 from homeassistant.util import dt as dt_util
 
-from .api import VigieauAPI, VigieauAPIError
-from .config_flow import get_insee_code_fromcoord, SetupConfigFlow
+from .api import AddressAPI, AddressAPIError, InseeAPI, InseeAPIError, VigieauAPI, VigieauAPIError
+from .communes import CommuneArea
+from .config_flow import get_insee_code_fromcoord, tracker_coordinates, SetupConfigFlow
 from .const import (
     CONF_CITY,
     CONF_INSEE_CODE,
     CONF_LOCATION_MODE,
+    CONF_PROFILES,
+    CONF_TRACKER_ENTITY,
     CONF_ZONE_TYPE,
+    CONF_ZONE_TYPES,
     CONF_FOLLOW_HA_COORDS,
+    DEFAULT_PROFILE,
     DEVICE_ID_KEY,
     DOMAIN,
     HA_COORD,
     LEGACY_HA_COORD,
     LOCATION_MODES,
     NAME,
+    REFRESH_INTERVAL,
+    REFRESH_INTERVALS,
     SENSOR_DEFINITIONS,
     VigieEauSensorEntityDescription,
     LEVEL_COLORS,
+    usage_lookup,
+    usage_match_texts,
 )
+from .matching import SENSOR_MATCHER
 
 
 _LOGGER = logging.getLogger(__name__)
@@ -59,6 +75,25 @@ MIGRATED_FROM_VERSION_3 = "migrated_from_version_3"
 MIGRATED_FROM_VERSION_5 = "migrated_from_version_5"
 MIGRATED_FROM_VERSION_6 = "migrated_from_version_6"
 
+# stored along the location: validators and body of the last vigieau response, per profile and zone type
+HTTP_CACHE_KEY = "_http_cache"
+# stored along the location of entries following a tracker: contour of the current commune
+COMMUNE_AREA_KEY = "_commune_area"
+# maximum number of vigieau requests sent at once by a coordinator
+MAX_CONCURRENT_REQUESTS = 4
+# location changes are written to storage after this delay, grouping successive changes
+LOCATION_SAVE_DELAY = 10  # seconds
+# decrees dates are expressed in metropolitan France local time
+DECREE_TIMEZONE = ZoneInfo("Europe/Paris")
+# a refresh closer than this fraction of the interval to the previous one is skipped to the next slot
+MIN_REFRESH_GAP = 0.25
+# a refresh at the end of a decree is never scheduled sooner than this
+MIN_REFRESH_DELAY = 60  # seconds
+# refreshes at the end of decrees are spread over this window by entry phase: most decrees end at midnight
+DECREE_END_SPREAD = timedelta(minutes=10)
+# after a failed refresh, whatever the alert level
+RETRY_INTERVAL = timedelta(minutes=15)
+
 STATE_NO_RESTRICTION = "Aucune restriction"
 STATE_TIME_BASED_BAN = "Interdiction sur plage horaire"
 STATE_BAN_WITH_EXCEPTIONS = "Interdiction sauf exception"
@@ -92,11 +127,30 @@ NON_RESTRICTED_STATES = {
 }
 
 
+def location_store(hass: HomeAssistant, entry_id: str) -> Store:
+    """Store of the last known location of an entry"""
+    return Store(
+        hass,
+        version=VigieauAPICoordinator.STORE_VERSION,
+        minor_version=0,
+        key=f"vigieau_current_location_{entry_id}",
+    )
+
+
 async def async_migrate_entry(hass, config_entry: ConfigEntry):
+    # migrations only geocode when the location can't be derived from what is already known,
+    # with a single address lookup: the commune index is not worth downloading for that
+    stored_location = await location_store(hass, config_entry.entry_id).async_load() or {}
+
     if config_entry.version == 1:
         _LOGGER.warn("config entry version is 1, migrating to version 2")
         new = {**config_entry.data}
-        insee_code, city_name, lat, lon = await get_insee_code_fromcoord(hass)
+        if CONF_INSEE_CODE in stored_location and CONF_CITY in stored_location:
+            insee_code, city_name = stored_location[CONF_INSEE_CODE], stored_location[CONF_CITY]
+            lat, lon = stored_location[CONF_LATITUDE], stored_location[CONF_LONGITUDE]
+        else:
+            insee_code, city_name, lat, lon = await AddressAPI(async_get_clientsession(hass), hass=hass).get_data(
+                hass.config.latitude, hass.config.longitude)
         new[CONF_INSEE_CODE] = insee_code
         new[CONF_CITY] = city_name
         new[CONF_LOCATION_MODE] = HA_COORD
@@ -115,16 +169,15 @@ async def async_migrate_entry(hass, config_entry: ConfigEntry):
     if config_entry.version == 2:
         _LOGGER.warn("config entry version is 2, migrating to version 3")
         new = {**config_entry.data}
-        insee_code, city_name, lat, lon = await get_insee_code_fromcoord(hass)
-        new[CONF_LATITUDE] = lat
-        new[CONF_LONGITUDE] = lon
+        # geocoding HA coordinates used to give them back unchanged
+        new[CONF_LATITUDE] = hass.config.latitude
+        new[CONF_LONGITUDE] = hass.config.longitude
         hass.config_entries.async_update_entry(
             config_entry, data=new, version=3)
 
     if config_entry.version == 3:
         _LOGGER.warn("config entry version is 3, migrating to version 4")
         new = {**config_entry.data}
-        insee_code, city_name, lat, lon = await get_insee_code_fromcoord(hass)
         new[MIGRATED_FROM_VERSION_3] = True
         hass.config_entries.async_update_entry(
             config_entry, data=new, version=4)
@@ -147,18 +200,42 @@ async def async_migrate_entry(hass, config_entry: ConfigEntry):
         new[MIGRATED_FROM_VERSION_6] = True
         hass.config_entries.async_update_entry(
             config_entry, data=new, version=7)
+    if config_entry.version == 7:
+        _LOGGER.warn("config entry version is 7, migrating to version 8")
+        new = {**config_entry.data}
+        new[CONF_PROFILES] = [DEFAULT_PROFILE]
+        hass.config_entries.async_update_entry(
+            config_entry, data=new, version=8)
+    if config_entry.version == 8:
+        _LOGGER.warn("config entry version is 8, migrating to version 9")
+        new = {**config_entry.data}
+        new[CONF_ZONE_TYPES] = [new[CONF_ZONE_TYPE]]
+        hass.config_entries.async_update_entry(
+            config_entry, data=new, version=9)
 
     return True
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     hass.data.setdefault(DOMAIN, {})
+    # read the usage lookup table out of the event loop, before any restriction is matched
+    await hass.async_add_executor_job(usage_lookup)
 
     # here we store the coordinator for future access
     if entry.entry_id not in hass.data[DOMAIN]:
         hass.data[DOMAIN][entry.entry_id] = {}
-        hass.data[DOMAIN][entry.entry_id]["vigieau_coordinator"] = VigieauAPICoordinator(
-            hass, dict(entry.data), entry.entry_id
+        coordinator = VigieauAPICoordinator(hass, dict(entry.data), entry.entry_id)
+        await coordinator.async_load_location()
+        hass.data[DOMAIN][entry.entry_id]["vigieau_coordinator"] = coordinator
+    coordinator = hass.data[DOMAIN][entry.entry_id]["vigieau_coordinator"]
+    if coordinator.config[CONF_FOLLOW_HA_COORDS]:
+        entry.async_on_unload(
+            hass.bus.async_listen(EVENT_CORE_CONFIG_UPDATE, coordinator.async_core_config_updated)
+        )
+    if CONF_TRACKER_ENTITY in coordinator.config:
+        entry.async_on_unload(
+            async_track_state_change_event(
+                hass, [coordinator.config[CONF_TRACKER_ENTITY]], coordinator.async_tracker_moved)
         )
 
     # will make sure async_setup_entry from sensor.py and binary_sensor.py are called
@@ -190,6 +267,11 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     )
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
+        loaded_entries = [
+            e for e in hass.config_entries.async_entries(DOMAIN) if e.entry_id in hass.data[DOMAIN]
+        ]
+        if not loaded_entries and TIME_BOUNDARY_SCHEDULER in hass.data[DOMAIN]:
+            hass.data[DOMAIN].pop(TIME_BOUNDARY_SCHEDULER).async_shutdown()
     return unload_ok
 
 
@@ -203,20 +285,103 @@ class VigieauAPICoordinator(DataUpdateCoordinator):
             hass,
             _LOGGER,
             name="vigieau api",  # for logging purpose
-            update_interval=timedelta(hours=1),
+            update_interval=REFRESH_INTERVAL,
             update_method=self.update_method,
+            # unchanged data (e.g a 304 from vigieau) does not notify entities
+            always_update=False,
         )
         self.config = config
         self.hass = hass
         self.config_entry_id = entry_id
+        self.refresh_phase = refresh_phase(entry_id)
+        # end of validity of the decrees in force, as of the last data received
+        self.decree_end: Optional[datetime] = None
 
-        self._custom_store = Store(
-            hass,
-            version=self.STORE_VERSION,
-            minor_version=0,
-            key=f"vigieau_current_location_{self.config_entry_id}",
-        )
+        self._custom_store = location_store(hass, self.config_entry_id)
         self._location = None
+        # HA moved but its new location could not be geocoded yet
+        self._relocation_pending = False
+        self._commune_area: Optional[CommuneArea] = None
+
+    async def async_load_location(self) -> None:
+        """Load the last known location, kept in memory from then on"""
+        self._location = await self._custom_store.async_load()
+        if self._location is None:
+            _LOGGER.debug("first save in storage")
+            self._location = {CONF_LATITUDE: self.config[CONF_LATITUDE], CONF_LONGITUDE: self.config[CONF_LONGITUDE], CONF_INSEE_CODE: self.config[CONF_INSEE_CODE], CONF_CITY: self.config[CONF_CITY], CONF_ZONE_TYPE: self.config[CONF_ZONE_TYPE]}
+            self._save_location()
+        if self.config[CONF_FOLLOW_HA_COORDS] and self.changed_location(self._location):
+            _LOGGER.info(
+                "Coordinates of HA instance changed while it was stopped, will look for vigieau data accordingly")
+            await self.update_config_based_on_location(self._location)
+        if CONF_TRACKER_ENTITY in self.config:
+            if self._location.get(COMMUNE_AREA_KEY) is not None:
+                self._commune_area = CommuneArea.from_dict(self._location[COMMUNE_AREA_KEY])
+            else:
+                area = await self._async_fetch_commune_area(self._location[CONF_INSEE_CODE])
+                self._location = {**self._location, COMMUNE_AREA_KEY: area}
+                self._save_location()
+            coordinates = tracker_coordinates(self.hass.states.get(self.config[CONF_TRACKER_ENTITY]))
+            if coordinates is not None:
+                await self.update_location_from_tracker(*coordinates)
+
+    async def async_tracker_moved(self, event: Event) -> None:
+        """Follow the tracker entity, refreshing only when it changes commune"""
+        coordinates = tracker_coordinates(event.data.get("new_state"))
+        if coordinates is not None and await self.update_location_from_tracker(*coordinates):
+            await self.async_refresh()
+
+    async def update_location_from_tracker(self, lat: float, lon: float) -> bool:
+        """
+        Update the location when the tracker left the current commune
+        Return whether the location changed
+        """
+        if self._commune_area is not None and self._commune_area.contains(lat, lon):
+            return False
+        try:
+            insee_code, city_name, lat, lon = await get_insee_code_fromcoord(self.hass, lat, lon)
+        except (ValueError, AddressAPIError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            _LOGGER.warning(
+                f"Impossible to fetch insee code from tracker location: {e}")
+            return False
+        if insee_code == self._location[CONF_INSEE_CODE]:
+            # outside of the known contour but geocoded in the same commune: contours are approximations
+            return False
+        self._location = {
+            CONF_LATITUDE: lat,
+            CONF_LONGITUDE: lon,
+            CONF_INSEE_CODE: insee_code,
+            CONF_CITY: city_name,
+            CONF_ZONE_TYPE: self._location[CONF_ZONE_TYPE],
+            COMMUNE_AREA_KEY: await self._async_fetch_commune_area(insee_code),
+        }
+        self._save_location()
+        _LOGGER.info(f"Tracker entered {city_name} ({insee_code})")
+        return True
+
+    async def _async_fetch_commune_area(self, insee_code: str) -> Optional[dict]:
+        """Fetch the contour of a commune, kept in memory and returned to be stored"""
+        try:
+            contour = await InseeAPI(async_get_clientsession(self.hass), hass=self.hass).get_contour(insee_code)
+            self._commune_area = CommuneArea.from_geojson(contour)
+        except (InseeAPIError, ValueError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            _LOGGER.warning(
+                f"Impossible to fetch contour of commune {insee_code}, tracker moves will be geocoded: {e}")
+            self._commune_area = None
+            return None
+        return self._commune_area.as_dict()
+
+    async def async_core_config_updated(self, event: Event) -> None:
+        """Follow the HA instance when it moves, right away"""
+        if not self.changed_location(self._location):
+            return
+        _LOGGER.info(
+            "Coordinates of HA instance changed, will look for vigieau data accordingly")
+        if await self.update_config_based_on_location(self._location):
+            await self.async_refresh()
+
+    def _save_location(self) -> None:
+        self._custom_store.async_delay_save(lambda: self._location, LOCATION_SAVE_DELAY)
 
     def location(self) -> dict:
         """
@@ -226,6 +391,29 @@ class VigieauAPICoordinator(DataUpdateCoordinator):
             return self._location
         return self.config
 
+    def next_refresh_delay(self, now: float, interval: timedelta = REFRESH_INTERVAL) -> float:
+        """
+        Seconds until the next refresh slot of this entry.
+        Slots are aligned on wall clock time, at the entry phase within the interval,
+        so that entries refresh at different times, before and after restarts.
+        """
+        interval_seconds = interval.total_seconds()
+        delay = (self.refresh_phase * interval_seconds - now) % interval_seconds
+        if delay < MIN_REFRESH_GAP * interval_seconds:
+            delay += interval_seconds
+        return delay
+
+    def _schedule_next_refresh(self, numeric_level: int) -> None:
+        """
+        Poll according to the alert level, and right when the decree in force expires
+        """
+        now = dt_util.utcnow()
+        delay = self.next_refresh_delay(now.timestamp(), REFRESH_INTERVALS.get(numeric_level, REFRESH_INTERVAL))
+        if self.decree_end is not None and self.decree_end > now:
+            decree_delay = max((self.decree_end - now).total_seconds(), MIN_REFRESH_DELAY)
+            delay = min(delay, decree_delay + self.refresh_phase * DECREE_END_SPREAD.total_seconds())
+        self.update_interval = timedelta(seconds=delay)
+
     async def update_method(self):
         """Fetch data from API endpoint."""
         try:
@@ -240,49 +428,70 @@ class VigieauAPICoordinator(DataUpdateCoordinator):
 
             _LOGGER.debug("Starting collecting data")
 
-            while True:
-                location = await self._custom_store.async_load()
-                if location is None:
-                    _LOGGER.debug("first save in storage")
-                    # make first save in storage
-                    await self._custom_store.async_save({CONF_LATITUDE: self.config[CONF_LATITUDE], CONF_LONGITUDE: self.config[CONF_LONGITUDE], CONF_INSEE_CODE: self.config[CONF_INSEE_CODE], CONF_CITY: self.config[CONF_CITY], CONF_ZONE_TYPE: self.config[CONF_ZONE_TYPE]})
-                    continue  # one more try
-                self._location = location
-                city_code = location[CONF_INSEE_CODE]
-                lat = location[CONF_LATITUDE]
-                long = location[CONF_LONGITUDE]
-                zone_type = location[CONF_ZONE_TYPE]
-
-                if self.config[CONF_FOLLOW_HA_COORDS] and self.changed_location(location):
-                    _LOGGER.info(
-                        "Coordinates of HA instance changed since last update, will look for vigieau data accordingly")
-                    await self.update_config_based_on_location(location)
-                    continue
-                break
+            if self._location is None:
+                await self.async_load_location()
+            if self._relocation_pending and self.changed_location(self._location):
+                await self.update_config_based_on_location(self._location)
+            location = self._location
+            city_code = location[CONF_INSEE_CODE]
+            lat = location[CONF_LATITUDE]
+            long = location[CONF_LONGITUDE]
 
             session = async_get_clientsession(self.hass)
-            vigieau = VigieauAPI(session)
+            http_caches = location.get(HTTP_CACHE_KEY) or {}
+            requests = [
+                (profile, zone_type)
+                for zone_type in self.config[CONF_ZONE_TYPES]
+                for profile in self.config[CONF_PROFILES]
+            ]
+            apis = {
+                request: VigieauAPI(session, cache=http_caches.get(http_cache_key(*request)), hass=self.hass)
+                for request in requests
+            }
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+            # responses shared by other entries may predate the end of the decree in force
+            decree_expired = self.decree_end is not None and self.decree_end <= dt_util.utcnow()
+
+            async def fetch(profile, zone_type):
+                async with semaphore:
+                    return await apis[(profile, zone_type)].get_data(
+                        lat, long, city_code, profile, zone_type, fresh=decree_expired)
+
             try:
-                # TODO(kamaradclimber): there 4 supported profils: particulier, entreprise, collectivite and exploitation
-                data = await vigieau.get_data(lat, long, city_code, "particulier", zone_type)
+                results = await asyncio.gather(*[fetch(*request) for request in requests])
             except VigieauAPIError as e:
                 raise UpdateFailed(f"Failed fetching vigieau data: {e.text}")
-
-            for usage in data["usages"]:
-                found = False
-                for sensor in SENSOR_DEFINITIONS:
-                    if sensor.match(usage):
-                        found = True
-                if not found:
-                    report_data = json.dumps(
-                        {"insee code": city_code, "nom": usage["nom"]},
-                        ensure_ascii=False,
-                    )
-                    _LOGGER.warn(
-                        f"The following restriction is unknown from this integration, please report an issue with: {report_data}"
-                    )
+            if any(api.cache is not http_caches.get(http_cache_key(*request)) for request, api in apis.items()):
+                self._location = {
+                    **location,
+                    HTTP_CACHE_KEY: {http_cache_key(*request): api.cache for request, api in apis.items()},
+                }
+                self._save_location()
+            if self.data is not None and all(
+                    api.last_response is not None and api.last_response.not_modified for api in apis.values()):
+                _LOGGER.debug("Vigieau data did not change, keeping previous data")
+                self._schedule_next_refresh(self.data["_numeric_state_value"])
+                return self.data
+            data = merge_restrictions(results, [zone_type for _, zone_type in requests])
+            self.decree_end = min(filter(None, map(decree_end, results)), default=None)
+
+            data["_usages_by_sensor"], unknown_usages = sort_usages_by_sensor(
+                data["usages"])
+            for usage in unknown_usages:
+                report_data = json.dumps(
+                    {"insee code": city_code, "nom": usage["nom"]},
+                    ensure_ascii=False,
+                )
+                _LOGGER.warn(
+                    f"The following restriction is unknown from this integration, please report an issue with: {report_data}"
+                )
+            _LOGGER.debug(
+                f"Restriction parsing caches: classification {cached_classify_restrictions.cache_info()}, time ranges {cached_extract_time_range.cache_info()}")
+            self._schedule_next_refresh(data["_numeric_state_value"])
             return data
         except Exception as err:
+            # neither hammer the API nor wait for hours while it is down
+            self.update_interval = RETRY_INTERVAL
             raise UpdateFailed(f"Error communicating with API: {err}")
 
     def changed_location(self, location: dict) -> bool:
@@ -290,32 +499,118 @@ class VigieauAPICoordinator(DataUpdateCoordinator):
         Return true if the location of the HA instance changed _significantly_ (i.e more than a few meters)
         compared to the configuration of this instance.
         """
-        ha_lon = self.hass.config.as_dict()["longitude"]
-        ha_lat = self.hass.config.as_dict()["latitude"]
+        ha_lon = self.hass.config.longitude
+        ha_lat = self.hass.config.latitude
         last_lon = location[CONF_LONGITUDE]
         last_lat = location[CONF_LATITUDE]
         # we use 4 decimals which corresponds to ~10m (it depends on the latitude actually but should be good enough)
         precision = 4
         return round(ha_lon, precision) != round(last_lon, precision) or round(ha_lat, precision) != round(last_lat, precision)
 
-    async def update_config_based_on_location(self, current_location) -> None:
+    async def update_config_based_on_location(self, current_location) -> bool:
         """
         Updates the entity config based on location
+        Return whether the new location could be found
         """
         try:
             insee_code, city_name, lat, lon = await get_insee_code_fromcoord(self.hass)
-        except ValueError as e:
+        except (ValueError, AddressAPIError, aiohttp.ClientError, asyncio.TimeoutError) as e:
             _LOGGER.warning(
-                f"Impossible to fetch insee code from new location: {e}")
-            return
-        await self._custom_store.async_save({CONF_LATITUDE: lat, CONF_LONGITUDE: lon, CONF_INSEE_CODE: insee_code, CONF_CITY: city_name, CONF_ZONE_TYPE: current_location[CONF_ZONE_TYPE]})
+                f"Impossible to fetch insee code from new location, will retry on next update: {e}")
+            self._relocation_pending = True
+            return False
+        self._relocation_pending = False
+        # validators of previous responses are dropped along the previous location
+        self._location = {CONF_LATITUDE: lat, CONF_LONGITUDE: lon, CONF_INSEE_CODE: insee_code, CONF_CITY: city_name, CONF_ZONE_TYPE: current_location[CONF_ZONE_TYPE]}
+        self._save_location()
         _LOGGER.info(f"New location detected {city_name} ({insee_code})")
+        return True
+
+
+def refresh_phase(entry_id: str) -> float:
+    """Deterministic position of an entry refreshes within the refresh interval, in [0, 1)"""
+    digest = hashlib.sha256(entry_id.encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64
+
+
+def decree_end(data: dict) -> Optional[datetime]:
+    """
+    End of validity of the decree in force, None when unknown.
+    A date without time means the decree is valid until the end of that day.
+    """
+    end = (data.get("arrete") or {}).get("dateFinValidite")
+    if not end:
+        return None
+    end_date = dt_util.parse_date(end)
+    if end_date is not None:
+        return datetime.combine(end_date + timedelta(days=1), dt_time(), tzinfo=DECREE_TIMEZONE)
+    end_datetime = dt_util.parse_datetime(end)
+    if end_datetime is None:
+        _LOGGER.debug(f"Unable to parse decree end date {end}")
+        return None
+    return end_datetime if end_datetime.tzinfo else end_datetime.replace(tzinfo=DECREE_TIMEZONE)
+
+
+def http_cache_key(profile: str, zone_type: str) -> str:
+    return f"{profile}/{zone_type}"
+
+
+def merge_restrictions(restrictions: list, zone_types: Optional[list] = None) -> dict:
+    """
+    Combine the data fetched for several profiles and zone types: the most severe one is kept,
+    with the usages of every request, each identical usage only once.
+    When several zone types are merged, each usage keeps its zone type and the decree it comes from.
+    """
+    if len(restrictions) == 1:
+        return restrictions[0]
+    data = dict(max(restrictions, key=lambda d: d["_numeric_state_value"]))
+    tag_zone_type = zone_types is not None and len(set(zone_types)) > 1
+    seen = set()
+    data["usages"] = []
+    for i, restriction in enumerate(restrictions):
+        for usage in restriction["usages"]:
+            if tag_zone_type:
+                usage = {**usage, "_zone_type": zone_types[i], "_arrete": restriction.get("arrete") or {}}
+            key = json.dumps(usage, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                data["usages"].append(usage)
+    return data
+
+
+def usage_label(usage: dict) -> str:
+    """Name of a usage in entity attributes, with its zone type when usages of several zone types are merged"""
+    if "_zone_type" in usage:
+        return f"{usage['nom']} ({zone_type_to_str(usage['_zone_type'])})"
+    return usage["nom"]
+
+
+def sort_usages_by_sensor(usages: list) -> Tuple[Dict[str, list], list]:
+    """
+    Match each usage once against every sensor definition.
+    Returns the usages concerning each sensor key, and the usages no sensor knows about.
+    """
+    usages_by_sensor = {sensor.key: [] for sensor in SENSOR_DEFINITIONS}
+    unknown_usages = []
+    for usage in usages:
+        sensor_keys = SENSOR_MATCHER.sensor_keys(usage_match_texts(usage))
+        for key in sensor_keys:
+            usages_by_sensor[key].append(usage)
+        if not sensor_keys:
+            unknown_usages.append(usage)
+    return usages_by_sensor, unknown_usages
 
 
 def zone_type_to_str(zone_type: str) -> str:
     return zone_type or "unknown"
 
 
+# The same few hundred descriptions and hours come back on every refresh, for every entity and
+# every entry: parsing results are shared by all entities. cache_info() gives hit and miss counters.
+PARSING_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=PARSING_CACHE_SIZE)
 def _parse_time_str(time_str: str) -> Optional[dt_time]:
     """Parse time string from API (HH:MM or HHhMM) into datetime.time"""
     if not time_str:
@@ -338,7 +633,119 @@ def _parse_time_str(time_str: str) -> Optional[dt_time]:
     return None
 
 
+SECONDS_PER_DAY = 24 * 3600
+
+
+def _seconds_since_midnight(t: dt_time) -> int:
+    return t.hour * 3600 + t.minute * 60 + t.second
+
+
+class DailySchedule:
+    """
+    Restricted periods of a day, built once from (start, end) time ranges.
+    Overlapping and overnight ranges are merged into sorted arrays of boundaries,
+    so that lookups are binary searches.
+    """
+
+    def __init__(self, ranges):
+        intervals = []
+        for start_time, end_time in ranges:
+            start = _seconds_since_midnight(start_time)
+            end = _seconds_since_midnight(end_time)
+            if start < end:
+                intervals.append((start, end))
+            elif start > end:
+                # overnight range
+                intervals.append((start, SECONDS_PER_DAY))
+                intervals.append((0, end))
+        intervals.sort()
+
+        merged = []
+        for start, end in intervals:
+            if merged and start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], end)
+            elif start < end:
+                merged.append([start, end])
+        self._starts = [start for start, _ in merged]
+        self._ends = [end for _, end in merged]
+
+        # midnight is not a transition when restriction spans it
+        spans_midnight = bool(merged) and merged[0][0] == 0 and merged[-1][1] == SECONDS_PER_DAY
+        transitions = []
+        for start, end in merged:
+            if not (spans_midnight and start == 0):
+                transitions.append((start, True))
+            if not (spans_midnight and end == SECONDS_PER_DAY):
+                transitions.append((end % SECONDS_PER_DAY, False))
+        transitions.sort()
+        self._transitions = transitions
+        self._transition_seconds = [second for second, _ in transitions]
+
+    def __repr__(self) -> str:
+        periods = ", ".join(
+            f"{start // 3600:02d}:{start % 3600 // 60:02d}-{end // 3600:02d}:{end % 3600 // 60:02d}"
+            for start, end in zip(self._starts, self._ends)
+        )
+        return f"DailySchedule({periods})"
+
+    def is_restricted(self, now_time: dt_time) -> bool:
+        second = _seconds_since_midnight(now_time)
+        index = bisect_right(self._starts, second) - 1
+        return index >= 0 and second < self._ends[index]
+
+    def _next_transitions(self, now):
+        """Yield the (datetime, becomes_restricted) transitions of the next 24 hours, strictly after now"""
+        first = bisect_right(self._transition_seconds, _seconds_since_midnight(now.time()))
+        count = len(self._transitions)
+        for position in range(first, first + count):
+            second, becomes_restricted = self._transitions[position % count]
+            when = now.replace(
+                hour=second // 3600, minute=second % 3600 // 60, second=second % 60, microsecond=0)
+            if position >= count:
+                when += timedelta(days=1)
+            yield when, becomes_restricted
+
+    def next_transition(self, now):
+        """Next time restriction status changes, None if it never does"""
+        return next((when for when, _ in self._next_transitions(now)), None)
+
+    def next_restriction_start(self, now):
+        return next((when for when, restricted in self._next_transitions(now) if restricted), None)
+
+    def next_restriction_end(self, now):
+        return next((when for when, restricted in self._next_transitions(now) if not restricted), None)
+
+
 _TIME_CLASSIFICATION_PATTERNS = [r"interdiction sur plage horaire", r"(?:interdiction|interdit).*\d+\s*h"]
+_TIME_CLASSIFICATION_REGEX = re.compile("|".join(_TIME_CLASSIFICATION_PATTERNS), re.IGNORECASE)
+_INTERDICTION_REGEX = re.compile(r"interdiction", re.IGNORECASE)
+
+# Ordered by priority: the first rule matching any of the descriptions gives the restriction level
+_RESTRICTION_LEVEL_RULES = [
+    (re.compile(matcher, re.IGNORECASE), level)
+    for matcher, level in [
+        ("interdi.*sauf", STATE_BAN_WITH_EXCEPTIONS),
+        ("à l\u2019exception", STATE_BAN_WITH_EXCEPTIONS),
+        ("à l\u2019exclusion", STATE_BAN_WITH_EXCEPTIONS),
+        ("Interdit.*dès lors", STATE_BAN_WITH_EXCEPTIONS),
+        ("Interdiction", STATE_BAN),
+        ("interdit", STATE_BAN),
+        ("interdiction", STATE_BAN),
+        ("limitation au strict nécessaire", STATE_BAN_EXCEPT_STRICTLY_NECESSARY),
+        ("Réduction de prélèvement", STATE_WATER_WITHDRAWAL_REDUCTION),
+        ("Consulter l\u2019arrêté", STATE_ERROR_CHECK_DECREE),
+        ("Se référer à l'arrêté de restriction en cours de validité.", STATE_ERROR_CHECK_DECREE),
+        ("Pas de restriction sauf arrêté spécifique.", STATE_ALLOWED_EXCEPT_SPECIFIC_DECREE),
+        ("Sensibiliser", STATE_AWARENESS),
+        ("Sensibilisation", STATE_AWARENESS),
+        ("il est demandé", STATE_AWARENESS),
+        ("Réduction", STATE_REDUCTION),
+    ]
+]
+
+
+_TIME_RANGE_REGEX = re.compile(r"(\d{1,2})\s*h.*?(\d{1,2})\s*h")
+_EXCEPTION_WORDING_REGEX = re.compile(r"sauf|except|uniquement", re.IGNORECASE)
 
 
 def classify_restrictions(restrictions):
@@ -347,67 +754,28 @@ def classify_restrictions(restrictions):
     Returns (level_string, is_time_based).
     level_string is None when the restrictions cannot be interpreted.
     """
-    def any_restriction_match(matcher):
-        r = re.compile(matcher, re.IGNORECASE)
-        for restriction in restrictions:
-            if r.search(restriction):
-                return True
-        return False
-
-    def has_time_based_interdiction():
-        for pattern in _TIME_CLASSIFICATION_PATTERNS:
-            r = re.compile(pattern, re.IGNORECASE)
-            for restriction in restrictions:
-                if r.search(restriction):
-                    return True
-        return False
-
-    def has_non_time_interdiction():
-        r_inter = re.compile(r"interdiction", re.IGNORECASE)
-        r_time = re.compile("|".join(_TIME_CLASSIFICATION_PATTERNS), re.IGNORECASE)
-        for restriction in restrictions:
-            if r_inter.search(restriction) and not r_time.search(restriction):
-                return True
-        return False
-
     if len(restrictions) == 0:
         return (STATE_NO_RESTRICTION, False)
 
-    if not has_non_time_interdiction() and has_time_based_interdiction():
+    has_time_based_interdiction = False
+    has_non_time_interdiction = False
+    best_rule = len(_RESTRICTION_LEVEL_RULES)
+    for restriction in restrictions:
+        if _TIME_CLASSIFICATION_REGEX.search(restriction):
+            has_time_based_interdiction = True
+        elif _INTERDICTION_REGEX.search(restriction):
+            has_non_time_interdiction = True
+        # only rules with a higher priority than the best hit so far can change the result
+        for index in range(best_rule):
+            if _RESTRICTION_LEVEL_RULES[index][0].search(restriction):
+                best_rule = index
+                break
+
+    if not has_non_time_interdiction and has_time_based_interdiction:
         return (STATE_TIME_BASED_BAN, True)
 
-    if any_restriction_match("interdi.*sauf"):
-        return (STATE_BAN_WITH_EXCEPTIONS, False)
-    if any_restriction_match("à l\u2019exception"):
-        return (STATE_BAN_WITH_EXCEPTIONS, False)
-    if any_restriction_match("à l\u2019exclusion"):
-        return (STATE_BAN_WITH_EXCEPTIONS, False)
-    if any_restriction_match("Interdit.*dès lors"):
-        return (STATE_BAN_WITH_EXCEPTIONS, False)
-    if any_restriction_match("Interdiction"):
-        return (STATE_BAN, False)
-    if any_restriction_match("interdit"):
-        return (STATE_BAN, False)
-    if any_restriction_match("interdiction"):
-        return (STATE_BAN, False)
-    if any_restriction_match("limitation au strict nécessaire"):
-        return (STATE_BAN_EXCEPT_STRICTLY_NECESSARY, False)
-    if any_restriction_match("Réduction de prélèvement"):
-        return (STATE_WATER_WITHDRAWAL_REDUCTION, False)
-    if any_restriction_match("Consulter l\u2019arrêté"):
-        return (STATE_ERROR_CHECK_DECREE, False)
-    if any_restriction_match("Se référer à l'arrêté de restriction en cours de validité."):
-        return (STATE_ERROR_CHECK_DECREE, False)
-    if any_restriction_match("Pas de restriction sauf arrêté spécifique."):
-        return (STATE_ALLOWED_EXCEPT_SPECIFIC_DECREE, False)
-    if any_restriction_match("Sensibiliser"):
-        return (STATE_AWARENESS, False)
-    if any_restriction_match("Sensibilisation"):
-        return (STATE_AWARENESS, False)
-    if any_restriction_match("il est demandé"):
-        return (STATE_AWARENESS, False)
-    if any_restriction_match("Réduction"):
-        return (STATE_REDUCTION, False)
+    if best_rule < len(_RESTRICTION_LEVEL_RULES):
+        return (_RESTRICTION_LEVEL_RULES[best_rule][1], False)
     if len(set(restrictions)) == 1:
         return (restrictions[0], False)
     return (None, False)
@@ -420,7 +788,7 @@ def extract_time_range(restrictions):
     Handles the "uniquement de X h à Y h" inversion (allowed window → restricted window).
     """
     for restriction in restrictions:
-        match = re.search(r"(\d{1,2})\s*h.*?(\d{1,2})\s*h", restriction)
+        match = _TIME_RANGE_REGEX.search(restriction)
         if match:
             start_str = f"{match.group(1)}h"
             end_str = f"{match.group(2)}h"
@@ -429,12 +797,102 @@ def extract_time_range(restrictions):
             if start_time is not None and end_time is not None:
                 # Overnight range with exception wording (sauf/except/uniquement)
                 # describes the ALLOWED window. Swap to get the RESTRICTED window.
-                if start_time > end_time and re.search(r"sauf|except|uniquement", restriction, re.IGNORECASE):
+                if start_time > end_time and _EXCEPTION_WORDING_REGEX.search(restriction):
                     start_time, end_time = end_time, start_time
                 return (start_time, end_time)
     return None
 
 
+@lru_cache(maxsize=PARSING_CACHE_SIZE)
+def cached_classify_restrictions(restrictions: Tuple[str, ...]):
+    """Memoized classify_restrictions, keyed by the tuple of descriptions"""
+    return classify_restrictions(restrictions)
+
+
+@lru_cache(maxsize=PARSING_CACHE_SIZE)
+def cached_extract_time_range(restrictions: Tuple[str, ...]):
+    """Memoized extract_time_range, keyed by the tuple of descriptions"""
+    return extract_time_range(restrictions)
+
+
+TIME_BOUNDARY_SCHEDULER = "time_boundary_scheduler"
+
+
+class TimeBoundaryScheduler:
+    """
+    Integration-wide timer for time-based restriction entities.
+    Most entities share the same boundaries (8h, 20h, ...): actions are grouped by instant in a
+    min-heap and a single timer is armed for the earliest one, running every action due at once.
+    """
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._instants: list = []  # heap, may contain instants whose actions were all cancelled
+        self._actions: Dict[Any, Dict[object, Any]] = {}
+        self._armed_at = None
+        self._unsub_timer = None
+
+    def async_schedule(self, when, action):
+        """Run action(now) at when. Returns a callable cancelling it"""
+        token = object()
+        if when not in self._actions:
+            self._actions[when] = {}
+            heapq.heappush(self._instants, when)
+        self._actions[when][token] = action
+        self._arm()
+
+        def cancel():
+            actions = self._actions.get(when)
+            if actions is not None:
+                actions.pop(token, None)
+                if not actions and self._instants and self._instants[0] == when:
+                    self._arm()
+        return cancel
+
+    def async_shutdown(self):
+        """Drop every pending action and the armed timer"""
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+        self._armed_at = None
+        self._instants.clear()
+        self._actions.clear()
+
+    def _arm(self):
+        while self._instants and not self._actions.get(self._instants[0]):
+            self._actions.pop(heapq.heappop(self._instants), None)
+        earliest = self._instants[0] if self._instants else None
+        if earliest == self._armed_at:
+            return
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+        self._armed_at = earliest
+        if earliest is not None:
+            _LOGGER.debug(f"Next time boundary at {earliest.isoformat()}, {len(self._instants)} instants pending")
+            self._unsub_timer = async_track_point_in_time(
+                self.hass, self._boundary_reached, earliest)
+
+    @callback
+    def _boundary_reached(self, now):
+        self._unsub_timer = None
+        self._armed_at = None
+        due = []
+        while self._instants and self._instants[0] <= now:
+            due.extend(self._actions.pop(heapq.heappop(self._instants), {}).values())
+        _LOGGER.debug(f"Time boundary reached, updating {len(due)} entities")
+        for action in due:
+            action(now)
+        self._arm()
+
+
+def get_time_boundary_scheduler(hass: HomeAssistant) -> TimeBoundaryScheduler:
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if TIME_BOUNDARY_SCHEDULER not in domain_data:
+        domain_data[TIME_BOUNDARY_SCHEDULER] = TimeBoundaryScheduler(hass)
+    return domain_data[TIME_BOUNDARY_SCHEDULER]
+
+
 class AlertLevelEntity(CoordinatorEntity, SensorEntity):
     """Expose the alert level for the location"""
 
@@ -580,7 +1038,7 @@ class RestrictionMixin:
 
     def compute_native_value(self) -> Optional[str]:
         """This method extract the most relevant restriction level to display as aggregate"""
-        result, is_time_based = classify_restrictions(self._restrictions)
+        result, is_time_based = cached_classify_restrictions(tuple(self._restrictions))
         self._native_is_time_based = is_time_based
         if result is None:
             report_data = json.dumps(
@@ -596,7 +1054,7 @@ class RestrictionMixin:
         return self._native_is_time_based
 
     def _extract_time_range_from_descriptions(self):
-        return extract_time_range(self._restrictions)
+        return cached_extract_time_range(tuple(self._restrictions))
 
     def _get_effective_time_ranges(self):
         ranges = []
@@ -612,23 +1070,17 @@ class RestrictionMixin:
     def _is_currently_restricted(self, now_time=None):
         if now_time is None:
             now_time = dt_util.now().time()
-        for start_time, end_time in self._get_effective_time_ranges():
-            if start_time <= end_time:
-                if start_time <= now_time < end_time:
-                    return True
-            else:
-                if now_time >= start_time or now_time < end_time:
-                    return True
-        return False
+        return self._daily_schedule.is_restricted(now_time)
 
     def _update_dynamic_attributes(self):
         R = self._attr_state_attributes.get("restriction") if self._attr_state_attributes else None
 
         if self._native_is_time_based:
-            now_time = dt_util.now().time()
-            is_restricted = self._is_currently_restricted(now_time)
-            time_ranges = self._get_effective_time_ranges()
-            _LOGGER.debug(f"Dynamic attr for {self.unique_id}: time_based=True, now_time={now_time}, ranges={time_ranges}, is_restricted={is_restricted}, R={R}")
+            now = dt_util.now()
+            is_restricted = self._is_currently_restricted(now.time())
+            _LOGGER.debug(
+                "Dynamic attr for %s: time_based=True, now_time=%s, schedule=%s, is_restricted=%s, R=%s",
+                self.unique_id, now.time(), self._daily_schedule, is_restricted, R)
         elif R in NON_RESTRICTED_STATES:
             is_restricted = False
         else:
@@ -636,38 +1088,14 @@ class RestrictionMixin:
 
         self._attr_state_attributes["currently_restricted"] = is_restricted
 
+        next_coupure = None
+        next_autorisation = None
         if self._native_is_time_based:
-            now = dt_util.now()
-            now_time = now.time()
-            ranges = self._get_effective_time_ranges()
-
-            if ranges:
-                start_time, end_time = ranges[0]
-                start_dt = now.replace(hour=start_time.hour, minute=start_time.minute, second=0, microsecond=0)
-                end_dt = now.replace(hour=end_time.hour, minute=end_time.minute, second=0, microsecond=0)
-
-                if start_dt <= now:
-                    start_dt += timedelta(days=1)
-                if end_dt <= now:
-                    end_dt += timedelta(days=1)
-
-                if start_time > end_time:
-                    if is_restricted:
-                        next_autorisation = end_dt
-                        next_coupure = start_dt
-                    else:
-                        next_coupure = start_dt
-                        next_autorisation = end_dt
-                else:
-                    if is_restricted:
-                        next_autorisation = end_dt
-                        next_coupure = start_dt
-                    else:
-                        next_coupure = start_dt
-                        next_autorisation = end_dt
-
-                self._attr_state_attributes["next_restriction_start"] = next_coupure.isoformat()
-                self._attr_state_attributes["next_restriction_end"] = next_autorisation.isoformat()
+            next_coupure = self._daily_schedule.next_restriction_start(now)
+            next_autorisation = self._daily_schedule.next_restriction_end(now)
+        if next_coupure is not None and next_autorisation is not None:
+            self._attr_state_attributes["next_restriction_start"] = next_coupure.isoformat()
+            self._attr_state_attributes["next_restriction_end"] = next_autorisation.isoformat()
         else:
             self._attr_state_attributes.pop("next_restriction_start", None)
             self._attr_state_attributes.pop("next_restriction_end", None)
@@ -680,44 +1108,18 @@ class RestrictionMixin:
 
     def _schedule_next_time_update(self):
         now = dt_util.now()
-        now_time = now.time()
-        next_boundary = None
-        ranges = self._get_effective_time_ranges()
+        next_boundary = self._daily_schedule.next_transition(now)
 
-        _LOGGER.debug(f"Schedule compute for {self.unique_id}: now={now.isoformat()}, now_time={now_time}, ranges={ranges}, time_restrictions={getattr(self, '_time_restrictions', {})}, extracted_range={getattr(self, '_extracted_time_range', None)}")
-
-        for start_time, end_time in ranges:
-            start_dt = now.replace(hour=start_time.hour, minute=start_time.minute, second=0, microsecond=0)
-            end_dt = now.replace(hour=end_time.hour, minute=end_time.minute, second=0, microsecond=0)
-
-            _LOGGER.debug(f"Range raw: start_time={start_time}, end_time={end_time}, start_dt={start_dt}, end_dt={end_dt}")
-
-            if start_dt <= now:
-                start_dt += timedelta(days=1)
-                _LOGGER.debug(f"start_dt adjusted to {start_dt} (was <= now)")
-            if end_dt <= now:
-                end_dt += timedelta(days=1)
-                _LOGGER.debug(f"end_dt adjusted to {end_dt} (was <= now)")
-
-            if start_time > end_time:
-                if now_time >= start_time or now_time < end_time:
-                    candidate = end_dt
-                else:
-                    candidate = start_dt
-            else:
-                candidate = min(start_dt, end_dt)
-
-            _LOGGER.debug(f"Candidate for range {start_time}-{end_time}: {candidate.isoformat()}, start_dt={start_dt.isoformat()}, end_dt={end_dt.isoformat()}")
-
-            if next_boundary is None or candidate < next_boundary:
-                next_boundary = candidate
+        _LOGGER.debug(
+            "Schedule compute for %s: now=%s, schedule=%s, time_restrictions=%s, extracted_range=%s",
+            self.unique_id, now, self._daily_schedule, getattr(self, '_time_restrictions', {}),
+            getattr(self, '_extracted_time_range', None))
 
         if next_boundary is not None:
             _LOGGER.debug(f"Scheduling next attribute update for {self.unique_id} at {next_boundary.isoformat()} (tzinfo={next_boundary.tzinfo})")
-            self._unsub_timer = async_track_point_in_time(
-                self.hass,
-                self._time_boundary_reached,
+            self._unsub_timer = get_time_boundary_scheduler(self.hass).async_schedule(
                 next_boundary,
+                self._time_boundary_reached,
             )
         else:
             _LOGGER.debug(f"No next boundary to schedule for {self.unique_id}")
@@ -749,32 +1151,37 @@ class RestrictionMixin:
         self._attr_translation_placeholders = {
             "city": self._config_entry.data.get(CONF_CITY)
         }
-        for usage in self.coordinator.data["usages"]:
-            if self._config.match(usage):
-                self._attr_state_attributes = self._attr_state_attributes or {}
-                restriction = usage.get("description")
-                if restriction is None:
-                    raise UpdateFailed(
-                        "Restriction level is not specified"
-                    )
-                self._attr_state_attributes[
-                    f"usage: {usage['nom']}"
-                ] = restriction
-                self._restrictions.append(restriction)
-
+        # usages are matched against sensors once per refresh by the coordinator
+        for usage in self.coordinator.data["_usages_by_sensor"].get(self._config.key, []):
+            self._attr_state_attributes = self._attr_state_attributes or {}
+            restriction = usage.get("description")
+            if restriction is None:
+                raise UpdateFailed(
+                    "Restriction level is not specified"
+                )
+            label = usage_label(usage)
+            self._attr_state_attributes[
+                f"usage: {label}"
+            ] = restriction
+            self._restrictions.append(restriction)
+
+            self.enrich_attributes(
+                usage, "details", f"{label} (details)"
+            )
+            if "_arrete" in usage:
                 self.enrich_attributes(
-                    usage, "details", f"{usage['nom']} (details)"
+                    usage["_arrete"], "cheminFichier", f"{label} (source)"
                 )
-                if "heureFin" in usage and "heureDebut" in usage:
-                    debut = usage["heureDebut"]
-                    fin = usage["heureFin"]
-                    debut_time = _parse_time_str(debut)
-                    fin_time = _parse_time_str(fin)
-                    # Overnight range with exception wording (sauf/except/uniquement)
-                    # describes the ALLOWED window. Swap to get the RESTRICTED window.
-                    if debut_time is not None and fin_time is not None and debut_time > fin_time and re.search(r"sauf|except|uniquement", restriction, re.IGNORECASE):
-                        debut, fin = fin, debut
-                    self._time_restrictions[usage["nom"]] = [debut, fin]
+            if "heureFin" in usage and "heureDebut" in usage:
+                debut = usage["heureDebut"]
+                fin = usage["heureFin"]
+                debut_time = _parse_time_str(debut)
+                fin_time = _parse_time_str(fin)
+                # Overnight range with exception wording (sauf/except/uniquement)
+                # describes the ALLOWED window. Swap to get the RESTRICTED window.
+                if debut_time is not None and fin_time is not None and debut_time > fin_time and re.search(r"sauf|except|uniquement", restriction, re.IGNORECASE):
+                    debut, fin = fin, debut
+                self._time_restrictions[label] = [debut, fin]
 
         if len(set([repr(r) for r in self._time_restrictions.values()])) == 1:
             restrictions = list(self._time_restrictions.values())[0]
@@ -794,6 +1201,7 @@ class RestrictionMixin:
 
         if not self._time_restrictions:
             self._extracted_time_range = self._extract_time_range_from_descriptions()
+        self._daily_schedule = DailySchedule(self._get_effective_time_ranges())
 
         native_value = self.compute_native_value()
         self._attr_state_attributes["restriction"] = native_value
@@ -836,6 +1244,7 @@ class UsageRestrictionEntity(RestrictionMixin, CoordinatorEntity, SensorEntity):
         self._unsub_timer = None
         self._native_is_time_based = False
         self._extracted_time_range = None
+        self._daily_schedule = DailySchedule([])
         legacy_name = f"{description.name}_restrictions_{config_entry.data.get(CONF_CITY)}"
         if MIGRATED_FROM_VERSION_1 in config_entry.data:
             self._attr_unique_id = f"sensor-vigieau-{self._config.key}"
@@ -883,6 +1292,7 @@ class UsageRestrictionBinaryEntity(RestrictionMixin, CoordinatorEntity, BinarySe
         self._unsub_timer = None
         self._native_is_time_based = False
         self._extracted_time_range = None
+        self._daily_schedule = DailySchedule([])
         self._attr_unique_id = f"binary_sensor-vigieau-{self._config.key}-{config_entry.data.get(CONF_INSEE_CODE)}-{config_entry.data.get(CONF_LATITUDE)}-{config_entry.data.get(CONF_LONGITUDE)}-{config_entry.data.get(CONF_ZONE_TYPE)}"
         self._attr_device_info = self.build_device()
 
@@ -1,10 +1,16 @@
+import asyncio
 import logging
+import time
 import aiohttp
-from typing import Optional, Tuple
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping, Optional, Tuple
 from aiohttp.client import ClientTimeout
+from homeassistant.core import HomeAssistant
 from homeassistant.helpers.update_coordinator import UpdateFailed
+from homeassistant.util.json import json_loads
 
-from .const import ADDRESS_API_URL, GEOAPI_GOUV_URL, VIGIEAU_API_URL
+from .const import ADDRESS_API_URL, GEOAPI_COMMUNE_URL, GEOAPI_GOUV_URL, REFRESH_INTERVALS, VIGIEAU_API_URL
 
 import re
 
@@ -13,6 +19,117 @@ CLIENT_TIMEOUT = ClientTimeout(total=120)
 _LOGGER = logging.getLogger(__name__)
 
 
+# shared by all entries and the three APIs, smooths the burst of requests at startup
+RATE_LIMIT = 2.0  # requests per second
+RATE_LIMIT_BURST = 10
+# window over which the effective request rate is measured
+RATE_WINDOW = 3600  # seconds
+
+
+class TokenBucket:
+    """Rate limiter: each request takes a token, tokens are refilled at a fixed rate up to a burst capacity"""
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT,
+        capacity: int = RATE_LIMIT_BURST,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Any] = asyncio.sleep,
+    ):
+        self._rate = rate
+        self._capacity = capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = float(capacity)
+        self._updated = clock()
+        self._granted: deque = deque()
+        # total time requests spent waiting for a token (seconds)
+        self.waited = 0.0
+
+    async def acquire(self) -> None:
+        now = self._clock()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        # the token is reserved right away, possibly going into debt: waiting callers are served in order
+        self._tokens -= 1
+        if self._tokens < 0:
+            delay = -self._tokens / self._rate
+            self.waited += delay
+            await self._sleep(delay)
+        self._granted.append(self._clock())
+
+    def request_rate(self) -> float:
+        """Requests per hour sent over the last RATE_WINDOW seconds"""
+        horizon = self._clock() - RATE_WINDOW
+        while self._granted and self._granted[0] < horizon:
+            self._granted.popleft()
+        return len(self._granted) * 3600 / RATE_WINDOW
+
+
+RATE_LIMITER = TokenBucket()
+
+
+@dataclass
+class RawResponse:
+    """A response with its body read, so that it can be handed to several callers"""
+
+    status: int
+    headers: Mapping[str, str]
+    payload: bytes
+
+
+class InFlightRequests:
+    """
+    Registry of requests being sent.
+    Concurrent callers asking for the same url (e.g all entries refreshing at startup) await the same response.
+    """
+
+    def __init__(self, rate_limiter: TokenBucket = RATE_LIMITER):
+        self._requests: dict = {}
+        self.rate_limiter = rate_limiter
+
+    async def get(
+            self, session: aiohttp.ClientSession, url: str, headers: Optional[dict] = None,
+            timeout: ClientTimeout = CLIENT_TIMEOUT, hass: Optional[HomeAssistant] = None) -> RawResponse:
+        """
+        Send a GET request, or join the identical one being sent.
+        With hass, the request is a background task of hass, cancelled when it stops.
+        """
+        headers = headers or {}
+        key = (url, tuple(sorted(headers.items())))
+        request = self._requests.get(key)
+        if request is None:
+            fetch = self._fetch(session, url, headers, timeout)
+            if hass is not None:
+                request = hass.async_create_background_task(fetch, f"vigieau request {url}")
+            else:
+                request = asyncio.ensure_future(fetch)
+            self._requests[key] = request
+            request.add_done_callback(lambda _: self._requests.pop(key, None))
+            request.add_done_callback(self._retrieve_exception)
+        else:
+            _LOGGER.debug("Joining in-flight request to %s", url)
+        # a cancelled caller must not cancel the request for the others
+        return await asyncio.shield(request)
+
+    @staticmethod
+    def _retrieve_exception(request: asyncio.Future) -> None:
+        # every caller may have been cancelled: nobody else would read the failure
+        if not request.cancelled() and request.exception() is not None:
+            _LOGGER.debug("Request failed: %s", request.exception())
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str, headers: dict, timeout: ClientTimeout) -> RawResponse:
+        await self.rate_limiter.acquire()
+        resp = await session.get(url, headers=headers, timeout=timeout)
+        return RawResponse(status=resp.status, headers=resp.headers, payload=await resp.read())
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+
+IN_FLIGHT_REQUESTS = InFlightRequests()
+
+
 class InseeAPIError(RuntimeError):
     pass
 
@@ -21,34 +138,40 @@ class InseeAPI:
     """API to get INSEE data"""
 
     def __init__(
-        self, session: Optional[aiohttp.ClientSession] = None, timeout=CLIENT_TIMEOUT
+        self, session: Optional[aiohttp.ClientSession] = None, timeout=CLIENT_TIMEOUT,
+        hass: Optional[HomeAssistant] = None,
     ) -> None:
         self._timeout = timeout
         self._session = session or aiohttp.ClientSession()
+        self._hass = hass
+
+    async def get_insee_list(self) -> list:
+        """Get all communes, with their INSEE code, name, centre and postal codes"""
+        return json_loads(await self.get_insee_list_payload())
 
-    async def get_insee_list(self):
-        """Get all INSEE codes"""
-        session = aiohttp.ClientSession()
-        resp = await session.get(GEOAPI_GOUV_URL)
+    async def get_insee_list_payload(self) -> bytes:
+        """Same as get_insee_list, not decoded: the list is large enough to be decoded out of the event loop"""
+        url = f"{GEOAPI_GOUV_URL},codesPostaux&format=json&geometry=centre"
+        resp = await IN_FLIGHT_REQUESTS.get(self._session, url, timeout=self._timeout, hass=self._hass)
 
         if resp.status != 200:
             raise InseeAPIError(
                 f"Unable to list all INSEE codes. API status was {resp.status}"
             )
 
-        return await resp.json()
+        return resp.payload
 
     async def get_data(self, zipcode) -> dict:
         """Get INSEE code for a given zip code"""
         url = f"{GEOAPI_GOUV_URL}&codePostal={zipcode}&format=json&geometry=centre"
 
-        resp = await self._session.get(url)
+        resp = await IN_FLIGHT_REQUESTS.get(self._session, url, timeout=self._timeout, hass=self._hass)
         if resp.status != 200:
             raise InseeAPIError(
                 f"Unable to get INSEE Code for zip {zipcode}"
             )
 
-        data = await resp.json()
+        data = json_loads(resp.payload)
         _LOGGER.debug("Got data GeoAPI : %s ", data)
 
         if len(data) == 0:
@@ -56,6 +179,21 @@ class InseeAPI:
 
         return data
 
+    async def get_contour(self, insee_code: str) -> dict:
+        """Get the contour of a commune, as a GeoJSON Polygon or MultiPolygon"""
+        url = f"{GEOAPI_COMMUNE_URL}/{insee_code}?fields=contour&format=json"
+
+        resp = await IN_FLIGHT_REQUESTS.get(self._session, url, timeout=self._timeout, hass=self._hass)
+        if resp.status != 200:
+            raise InseeAPIError(
+                f"Unable to get contour of commune {insee_code}"
+            )
+
+        data = json_loads(resp.payload)
+        if not data.get("contour"):
+            raise InseeAPIError(f"No contour received with GeoAPI for commune {insee_code}")
+        return data["contour"]
+
 
 class AddressAPIError(RuntimeError):
     pass
@@ -65,19 +203,21 @@ class AddressAPI:
     """API for Reverse geocoding"""
 
     def __init__(
-        self, session: Optional[aiohttp.ClientSession] = None, timeout=CLIENT_TIMEOUT
+        self, session: Optional[aiohttp.ClientSession] = None, timeout=CLIENT_TIMEOUT,
+        hass: Optional[HomeAssistant] = None,
     ) -> None:
         self._timeout = timeout
         self._session = session or aiohttp.ClientSession()
+        self._hass = hass
 
     async def get_data(self, lat: float, lon: float) -> Tuple[str, str, float, float]:
         url = f"{ADDRESS_API_URL}/reverse/?lat={lat}&lon={lon}&type=housenumber"
-        resp = await self._session.get(url)
+        resp = await IN_FLIGHT_REQUESTS.get(self._session, url, timeout=self._timeout, hass=self._hass)
         if resp.status != 200:
             raise AddressAPIError(
                 "Failed to fetch address from api-adresse.data.gouv.fr api"
             )
-        data = await resp.json()
+        data = json_loads(resp.payload)
         _LOGGER.debug(f"Data received from {ADDRESS_API_URL}: {data}")
         if len(data["features"]) == 0:
             _LOGGER.warn(
@@ -102,46 +242,210 @@ class VigieauAPIError(RuntimeError):
         return self._text
 
 
+NUMERIC_STATE_VALUES = {
+    "Pas de restrictions": 0,
+    "vigilance": 1,
+    "alerte": 2,
+    "alerte_renforcée": 3,
+    "alerte_renforcee": 3,
+    "crise": 4,
+}
+
+
+def _no_restriction_data() -> dict:
+    return {"niveauGravite": "Pas de restrictions", "usages": [], "arrete": {}}
+
+
+@dataclass
+class DecodedResponse:
+    """A response body, decoded once"""
+
+    status: int
+    body: Any
+    payload_size: int
+    decode_time: float
+    # True when the server confirmed the cached body is still valid
+    not_modified: bool = False
+
+
+# well below the shortest coordinator update interval so each entry still gets fresh data every interval
+RESPONSE_CACHE_TTL = min(REFRESH_INTERVALS.values()).total_seconds() / 2
+RESPONSE_CACHE_SIZE = 128
+# 4 decimals is ~10m, finer than any zone boundary
+COORDINATES_PRECISION = 4
+
+
+class ResponseCache:
+    """In-memory TTL cache with LRU eviction, shared by all config entries"""
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, maxsize: int = RESPONSE_CACHE_SIZE, clock: Callable[[], float] = time.monotonic):
+        self._ttl = ttl
+        self._maxsize = maxsize
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= self._clock():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value) -> None:
+        self._entries[key] = (self._clock() + self._ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+RESPONSE_CACHE = ResponseCache()
+
+
 class VigieauAPI:
     def __init__(
-        self, session: Optional[aiohttp.ClientSession] = None, timeout=CLIENT_TIMEOUT
+        self,
+        session: Optional[aiohttp.ClientSession] = None,
+        timeout=CLIENT_TIMEOUT,
+        decoder: Callable[[bytes], Any] = json_loads,
+        cache: Optional[dict] = None,
+        response_cache: Optional[ResponseCache] = RESPONSE_CACHE,
+        hass: Optional[HomeAssistant] = None,
     ) -> None:
         self._timeout = timeout
         self._session = session or aiohttp.ClientSession()
+        self._hass = hass
+        self._decoder = decoder
+        self.last_response: Optional[DecodedResponse] = None
+        # validators and decoded body of the last response, json serializable so it can be persisted
+        self.cache = cache
+        self._response_cache = response_cache
+
+    def _cached_response(self, url: str) -> Optional[dict]:
+        if self.cache is None or self.cache.get("url") != url:
+            return None
+        return self.cache
+
+    async def _request(self, url: str) -> DecodedResponse:
+        headers = {}
+        cached = self._cached_response(url)
+        if cached is not None:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+        resp = await IN_FLIGHT_REQUESTS.get(self._session, url, headers, self._timeout, self._hass)
+        if resp.status == 304 and cached is not None:
+            _LOGGER.debug("Vigieau replied data did not change since %s", cached.get("last_modified") or cached.get("etag"))
+            self.last_response = DecodedResponse(
+                status=cached["status"],
+                body=cached["body"],
+                payload_size=0,
+                decode_time=0,
+                not_modified=True,
+            )
+            return self.last_response
+        payload = resp.payload
+        # 404 carries a json message when there is no restriction
+        if resp.status != 404 and resp.status not in range(200, 300):
+            raise VigieauAPIError(f"Failed fetching vigieau data", payload.decode(errors="replace"))
+        start = time.perf_counter()
+        try:
+            body = self._decoder(payload)
+        except ValueError:
+            raise VigieauAPIError(f"Failed decoding vigieau data", payload.decode(errors="replace"))
+        decoded = DecodedResponse(
+            status=resp.status,
+            body=body,
+            payload_size=len(payload),
+            decode_time=time.perf_counter() - start,
+        )
+        _LOGGER.debug(
+            "Vigieau replied %s with %d bytes, decoded in %.2fms",
+            decoded.status, decoded.payload_size, decoded.decode_time * 1000)
+        self.last_response = decoded
+        etag = resp.headers.get("ETag")
+        last_modified = resp.headers.get("Last-Modified")
+        if etag or last_modified:
+            self.cache = {
+                "url": url,
+                "etag": etag,
+                "last_modified": last_modified,
+                "status": decoded.status,
+                "body": body,
+            }
+        else:
+            self.cache = None
+        return decoded
 
     async def get_data(
             self, lat: Optional[float], long: Optional[float], insee_code: str, profil: str,
-            zone_type: str) -> dict:
+            zone_type: str, fresh: bool = False) -> dict:
+        """
+        Fetch restrictions in force for a location.
+        When the server confirms nothing changed, data is built from the cached body and
+        last_response.not_modified is set.
+        With fresh, the shared response cache is bypassed, and updated with the response.
+        """
+        cache_key = (
+            insee_code,
+            profil,
+            zone_type,
+            None if lat is None else round(lat, COORDINATES_PRECISION),
+            None if long is None else round(long, COORDINATES_PRECISION),
+        )
+        if self._response_cache is not None and not fresh:
+            cached_data = self._response_cache.get(cache_key)
+            _LOGGER.debug(
+                "Vigieau response cache: %d entries, hit rate %.0f%%",
+                len(self._response_cache), self._response_cache.hit_rate * 100)
+            if cached_data is not None:
+                # shallow copy: callers add their own keys to the data
+                return dict(cached_data)
         url = f"{VIGIEAU_API_URL}/api/zones?commune={insee_code}&profil={profil}&zoneType={zone_type}"
         if lat is not None and long is not None:
             url += f"&lat={lat}&lon={long}"
         _LOGGER.debug(f"Requesting restrictions from {url}")
-        resp = await self._session.get(url)
+        resp = await self._request(url)
+        body = resp.body
         if (
             resp.status == 404
-            and "message" in await resp.json()
-            and re.match("Aucune zone.+en vigueur", (await resp.json())["message"])
+            and isinstance(body, dict)
+            and "message" in body
+            and re.match("Aucune zone.+en vigueur", body["message"])
         ):
             _LOGGER.debug(f"Vigieau replied with no restriction, faking data")
-            data = [{"niveauGravite": "Pas de restrictions",
-                     "usages": [], "arrete": {}}]
-        elif resp.status == 200 and (await resp.json()) == []:
+            data = _no_restriction_data()
+        elif resp.status == 200 and body == []:
             _LOGGER.debug(f"Vigieau replied with no data at all, faking data")
-            data = [{"niveauGravite": "Pas de restrictions",
-                     "usages": [], "arrete": {}}]
+            data = _no_restriction_data()
         elif resp.status in range(200, 300):
-            data = await resp.json()
+            # shallow copy: the body is kept in cache, keys added below must not end up there
+            data = dict(body[0])
         else:
-            raise VigieauAPIError(f"Failed fetching vigieau data", resp.text)
-        _LOGGER.debug(f"Data fetched from vigieau: {data}")
+            raise VigieauAPIError(f"Failed fetching vigieau data", str(body))
+        _LOGGER.debug("Data fetched from vigieau: %s", data)
         # enriching with numeric state value
-        data = data[0]
-        data["_numeric_state_value"] = {
-            "Pas de restrictions": 0,
-            "vigilance": 1,
-            "alerte": 2,
-            "alerte_renforcée": 3,
-            "alerte_renforcee": 3,
-            "crise": 4,
-        }[data["niveauGravite"]]
+        data["_numeric_state_value"] = NUMERIC_STATE_VALUES[data["niveauGravite"]]
+        if self._response_cache is not None:
+            self._response_cache.set(cache_key, data)
+            return dict(data)
         return data
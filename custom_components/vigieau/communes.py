@@ -0,0 +1,299 @@
+import asyncio
+import logging
+import math
+import aiohttp
+from datetime import timedelta
+from typing import Optional
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+from homeassistant.util.json import json_loads
+
+from .api import InseeAPI, InseeAPIError
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+COMMUNE_INDEX = "commune_index"
+COMMUNE_INDEX_LOCK = "commune_index_lock"
+COMMUNE_INDEX_FAILED_AT = "commune_index_failed_at"
+COMMUNE_INDEX_STORE_KEY = "vigieau_communes"
+COMMUNE_INDEX_STORE_VERSION = 1
+# communes and their postal codes change at most yearly
+COMMUNE_INDEX_TTL = timedelta(days=90)
+# the list is large: once its download failed, don't try again for every lookup
+COMMUNE_INDEX_RETRY_DELAY = timedelta(hours=1)
+
+GEOCODE_CACHE = "geocode_cache"
+GEOCODE_CACHE_LOCK = "geocode_cache_lock"
+GEOCODE_CACHE_STORE_KEY = "vigieau_geocode_cache"
+GEOCODE_CACHE_STORE_VERSION = 1
+GEOCODE_CACHE_TTL = timedelta(days=30)
+GEOCODE_CACHE_SIZE = 256
+GEOCODE_CACHE_SAVE_DELAY = 10  # seconds
+# same precision as location changes detection: ~10m
+GEOCODE_PRECISION = 4
+
+# spatial grid over commune centres
+GRID_CELL_SIZE = 0.1  # degrees
+KM_PER_DEGREE = 111.2
+# no commune centre is that far from any point of the commune (the largest, in French Guiana, excepted)
+MAX_COMMUNE_DISTANCE = 30  # km
+# a point is attributed locally only when clearly closer to the nearest centre than to the second one,
+# near the border of two communes the actual contours are needed
+AMBIGUITY_RATIO = 0.5
+
+
+class CommuneIndex:
+    """
+    Compact list of communes: one [code, nom, longitude, latitude, postal codes] row per commune,
+    indexed by postal code.
+    """
+
+    def __init__(self, rows: list, updated_at: float):
+        self._rows = rows
+        self.updated_at = updated_at
+        self._by_postal_code: dict[str, list[int]] = {}
+        for i, row in enumerate(rows):
+            for postal_code in row[4]:
+                self._by_postal_code.setdefault(postal_code, []).append(i)
+        # built on first reverse geocoding
+        self._grid: Optional[dict[tuple[int, int], list[int]]] = None
+
+    @classmethod
+    def from_communes(cls, communes: list, updated_at: float) -> "CommuneIndex":
+        """Build the index from the commune list of geo.api.gouv.fr"""
+        rows = []
+        for commune in communes:
+            # a few communes (e.g. "communes mortes pour la France") have no centre
+            if not commune.get("centre"):
+                continue
+            lon, lat = commune["centre"]["coordinates"]
+            rows.append([commune["code"], commune["nom"], lon, lat, commune.get("codesPostaux", [])])
+        return cls(rows, updated_at)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CommuneIndex":
+        return cls(data["communes"], data["updated_at"])
+
+    def as_dict(self) -> dict:
+        return {"updated_at": self.updated_at, "communes": self._rows}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def is_stale(self, now: float) -> bool:
+        return now - self.updated_at > COMMUNE_INDEX_TTL.total_seconds()
+
+    @staticmethod
+    def _as_commune(row: list) -> dict:
+        """Same format as geo.api.gouv.fr"""
+        return {
+            "code": row[0],
+            "nom": row[1],
+            "centre": {"type": "Point", "coordinates": [row[2], row[3]]},
+        }
+
+    def find_by_postal_code(self, postal_code: str) -> list[dict]:
+        return [self._as_commune(self._rows[i]) for i in self._by_postal_code.get(str(postal_code).strip(), [])]
+
+    @staticmethod
+    def _cell(lat: float, lon: float) -> tuple[int, int]:
+        return (math.floor(lat / GRID_CELL_SIZE), math.floor(lon / GRID_CELL_SIZE))
+
+    def _build_grid(self) -> dict[tuple[int, int], list[int]]:
+        grid: dict[tuple[int, int], list[int]] = {}
+        for i, row in enumerate(self._rows):
+            grid.setdefault(self._cell(row[3], row[2]), []).append(i)
+        return grid
+
+    def nearest(self, lat: float, lon: float, count: int = 2) -> list[tuple[float, dict]]:
+        """
+        The count commune centres nearest to a point, closer than MAX_COMMUNE_DISTANCE, with their distance in km.
+        Grid cells are visited in rings of growing size, until no unvisited cell can hold a closer centre.
+        """
+        if self._grid is None:
+            self._grid = self._build_grid()
+        lon_scale = math.cos(math.radians(lat))
+        # cells are narrower along longitudes, so distance to unvisited cells is bounded by their width
+        ring_width = GRID_CELL_SIZE * KM_PER_DEGREE * lon_scale
+        center_lat, center_lon = self._cell(lat, lon)
+        found: list[tuple[float, int]] = []
+        ring = 0
+        while True:
+            for cell_lat in range(center_lat - ring, center_lat + ring + 1):
+                for cell_lon in range(center_lon - ring, center_lon + ring + 1):
+                    if max(abs(cell_lat - center_lat), abs(cell_lon - center_lon)) != ring:
+                        continue
+                    for i in self._grid.get((cell_lat, cell_lon), []):
+                        row = self._rows[i]
+                        distance = KM_PER_DEGREE * math.hypot(row[3] - lat, (row[2] - lon) * lon_scale)
+                        if distance <= MAX_COMMUNE_DISTANCE:
+                            found.append((distance, i))
+            found.sort()
+            found = found[:count]
+            bound = ring * ring_width
+            if (len(found) == count and found[-1][0] <= bound) or bound > MAX_COMMUNE_DISTANCE:
+                break
+            ring += 1
+        return [(distance, self._as_commune(self._rows[i])) for distance, i in found]
+
+    def find_by_coordinates(self, lat: float, lon: float) -> Optional[dict]:
+        """
+        The commune most likely containing a point, None when it can't be told from commune centres only
+        (point near a border, or far from any centre).
+        A large commune may still hold points closer to a small neighbour centre: check the commune contour.
+        """
+        nearest = self.nearest(lat, lon)
+        if not nearest:
+            return None
+        if len(nearest) > 1 and nearest[0][0] > AMBIGUITY_RATIO * nearest[1][0]:
+            return None
+        return nearest[0][1]
+
+
+class CommuneArea:
+    """
+    Area of a commune: its contour rings, with their bounding box to rule out most points cheaply.
+    Holes and enclaves are handled by counting crossings over every ring (even-odd rule).
+    """
+
+    def __init__(self, rings: list):
+        # rings of [longitude, latitude] points, as in GeoJSON
+        self._rings = rings
+        lons = [point[0] for ring in rings for point in ring]
+        lats = [point[1] for ring in rings for point in ring]
+        self.bbox = (min(lats), min(lons), max(lats), max(lons))
+
+    @classmethod
+    def from_geojson(cls, geometry: dict) -> "CommuneArea":
+        if geometry["type"] == "Polygon":
+            return cls(geometry["coordinates"])
+        if geometry["type"] == "MultiPolygon":
+            return cls([ring for polygon in geometry["coordinates"] for ring in polygon])
+        raise ValueError(f"Unsupported commune contour {geometry['type']}")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CommuneArea":
+        return cls(data["rings"])
+
+    def as_dict(self) -> dict:
+        return {"rings": self._rings}
+
+    def contains(self, lat: float, lon: float) -> bool:
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        if not (min_lat <= lat <= max_lat and min_lon <= lon <= max_lon):
+            return False
+        inside = False
+        for ring in self._rings:
+            previous_lon, previous_lat = ring[-1][0], ring[-1][1]
+            for point in ring:
+                point_lon, point_lat = point[0], point[1]
+                if (point_lat > lat) != (previous_lat > lat):
+                    crossing_lon = point_lon + (lat - point_lat) * (previous_lon - point_lon) / (previous_lat - point_lat)
+                    if lon < crossing_lon:
+                        inside = not inside
+                previous_lon, previous_lat = point_lon, point_lat
+        return inside
+
+
+def _build_commune_index(payload: bytes, updated_at: float) -> CommuneIndex:
+    """Decode the commune list and index it, run in an executor"""
+    return CommuneIndex.from_communes(json_loads(payload), updated_at)
+
+
+async def async_commune_contains(hass: HomeAssistant, insee_code: str, lat: float, lon: float) -> bool:
+    """Whether a point is within the contour of a commune, False when the contour can't be fetched"""
+    try:
+        contour = await InseeAPI(async_get_clientsession(hass), hass=hass).get_contour(insee_code)
+        return CommuneArea.from_geojson(contour).contains(lat, lon)
+    except (InseeAPIError, ValueError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+        _LOGGER.debug(f"Unable to fetch contour of commune {insee_code}: {e}")
+        return False
+
+
+async def async_get_commune_index(hass: HomeAssistant) -> Optional[CommuneIndex]:
+    """
+    Return the commune index, loaded from storage or downloaded when missing or stale.
+    None when it is neither stored nor downloadable.
+    A failed download is only tried again after COMMUNE_INDEX_RETRY_DELAY.
+    """
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    lock = domain_data.setdefault(COMMUNE_INDEX_LOCK, asyncio.Lock())
+    async with lock:
+        now = dt_util.utcnow().timestamp()
+        index = domain_data.get(COMMUNE_INDEX)
+        store = Store(hass, version=COMMUNE_INDEX_STORE_VERSION, key=COMMUNE_INDEX_STORE_KEY)
+        if index is None:
+            stored = await store.async_load()
+            if stored is not None:
+                index = CommuneIndex.from_dict(stored)
+        failed_at = domain_data.get(COMMUNE_INDEX_FAILED_AT)
+        retry_allowed = failed_at is None or now - failed_at > COMMUNE_INDEX_RETRY_DELAY.total_seconds()
+        if (index is None or index.is_stale(now)) and retry_allowed:
+            try:
+                payload = await InseeAPI(async_get_clientsession(hass), hass=hass).get_insee_list_payload()
+                index = await hass.async_add_executor_job(_build_commune_index, payload, now)
+            except (InseeAPIError, ValueError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                _LOGGER.warning(f"Unable to download the list of communes, using stored one if any: {e}")
+                domain_data[COMMUNE_INDEX_FAILED_AT] = now
+            else:
+                domain_data.pop(COMMUNE_INDEX_FAILED_AT, None)
+                await store.async_save(index.as_dict())
+                _LOGGER.debug(f"Downloaded {len(index)} communes")
+        domain_data[COMMUNE_INDEX] = index
+        return index
+
+
+class GeocodeCache:
+    """
+    Communes found for coordinates rounded to GEOCODE_PRECISION, persisted so that lookups survive restarts.
+    Entries expire after GEOCODE_CACHE_TTL, the least recently used ones are evicted beyond GEOCODE_CACHE_SIZE.
+    """
+
+    def __init__(self, store: Store, entries: Optional[dict] = None):
+        self._store = store
+        # key -> [stored at, insee code, city], in least recently used order
+        self._entries: dict[str, list] = entries or {}
+
+    @staticmethod
+    def _key(lat: float, lon: float) -> str:
+        return f"{round(float(lat), GEOCODE_PRECISION)},{round(float(lon), GEOCODE_PRECISION)}"
+
+    def get(self, lat: float, lon: float, now: float) -> Optional[tuple[str, str]]:
+        key = self._key(lat, lon)
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        if now - entry[0] > GEOCODE_CACHE_TTL.total_seconds():
+            self._store.async_delay_save(self._data_to_save, GEOCODE_CACHE_SAVE_DELAY)
+            return None
+        self._entries[key] = entry
+        return (entry[1], entry[2])
+
+    def set(self, lat: float, lon: float, insee_code: str, city: str, now: float) -> None:
+        key = self._key(lat, lon)
+        self._entries.pop(key, None)
+        self._entries[key] = [now, insee_code, city]
+        while len(self._entries) > GEOCODE_CACHE_SIZE:
+            del self._entries[next(iter(self._entries))]
+        self._store.async_delay_save(self._data_to_save, GEOCODE_CACHE_SAVE_DELAY)
+
+    def _data_to_save(self) -> dict:
+        return {"entries": self._entries}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+async def async_get_geocode_cache(hass: HomeAssistant) -> GeocodeCache:
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    lock = domain_data.setdefault(GEOCODE_CACHE_LOCK, asyncio.Lock())
+    async with lock:
+        if GEOCODE_CACHE not in domain_data:
+            store = Store(hass, version=GEOCODE_CACHE_STORE_VERSION, key=GEOCODE_CACHE_STORE_KEY)
+            stored = await store.async_load()
+            domain_data[GEOCODE_CACHE] = GeocodeCache(store, stored and stored["entries"])
+        return domain_data[GEOCODE_CACHE]
@@ -5,16 +5,20 @@ import homeassistant.helpers.config_validation as cv
 
 from homeassistant import config_entries
 
-from homeassistant.const import CONF_LATITUDE, CONF_LONGITUDE
-from homeassistant.core import callback, HomeAssistant
+from homeassistant.const import ATTR_LATITUDE, ATTR_LONGITUDE, CONF_LATITUDE, CONF_LONGITUDE
+from homeassistant.core import callback, HomeAssistant, State
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util import dt as dt_util
 from homeassistant.helpers.selector import (
+    EntitySelector,
+    EntitySelectorConfig,
     LocationSelector,
     SelectSelector,
     SelectSelectorConfig,
 )
 
 from .api import InseeAPI, AddressAPI
+from .communes import async_commune_contains, async_get_commune_index, async_get_geocode_cache
 from .const import (
     CONF_CITY,
     CONF_CODE_POSTAL,
@@ -22,7 +26,11 @@ from .const import (
     CONF_FOLLOW_HA_COORDS,
     CONF_LOCATION_MAP,
     CONF_LOCATION_MODE,
+    CONF_PROFILES,
+    CONF_TRACKER_ENTITY,
     CONF_ZONE_TYPE,
+    CONF_ZONE_TYPES,
+    DEFAULT_PROFILE,
     DEVICE_ID_KEY,
     DOMAIN,
     HA_COORD,
@@ -30,7 +38,9 @@ from .const import (
     LEGACY_SELECT_COORD,
     LEGACY_ZIP_CODE,
     LOCATION_MODES,
+    PROFILES,
     SELECT_COORD,
+    TRACKER,
     ZIP_CODE,
     ZONE_TYPES,
 )
@@ -62,14 +72,30 @@ ZIPCODE_SCHEMA = vol.Schema(
     }
 )
 
+TRACKER_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_TRACKER_ENTITY): EntitySelector(
+            EntitySelectorConfig(domain=["device_tracker", "person"])
+        )
+    }
+)
+
 ZONE_TYPE_SCHEMA = vol.Schema(
     {
-        vol.Required(CONF_ZONE_TYPE, default="AEP"): SelectSelector(
+        vol.Required(CONF_ZONE_TYPES, default=["AEP"]): SelectSelector(
             SelectSelectorConfig(
                 options=list(ZONE_TYPES),
+                multiple=True,
                 translation_key="zone_type",
             )
-        )
+        ),
+        vol.Required(CONF_PROFILES, default=[DEFAULT_PROFILE]): SelectSelector(
+            SelectSelectorConfig(
+                options=list(PROFILES),
+                multiple=True,
+                translation_key="profile",
+            )
+        ),
     }
 )
 
@@ -85,9 +111,15 @@ def _normalize_location_mode(location_mode):
 
 async def get_insee_code_fromzip(hass: HomeAssistant, data: dict) -> None:
     """Get INSEE code from zip code"""
+    index = await async_get_commune_index(hass)
+    if index is not None:
+        communes = index.find_by_postal_code(data)
+        if communes:
+            return communes
+        _LOGGER.debug(f"Zip code {data} unknown from the commune index, asking geo.api.gouv.fr")
     session = async_get_clientsession(hass)
     try:
-        client = InseeAPI(session)
+        client = InseeAPI(session, hass=hass)
         return await client.get_data(data)
     except ValueError as exc:
         raise exc
@@ -97,23 +129,48 @@ async def get_insee_code_fromcoord(
     hass: HomeAssistant, lat=None, lon=None
 ) -> Tuple[str, str, float, float]:
     """Get INSEE code from GPS coords"""
+    if lat is None or lon is None:
+        lon = hass.config.longitude
+        lat = hass.config.latitude
+    geocode_cache = await async_get_geocode_cache(hass)
+    now = dt_util.utcnow().timestamp()
+    cached = geocode_cache.get(lat, lon, now)
+    if cached is not None:
+        return (*cached, lat, lon)
+    index = await async_get_commune_index(hass)
+    if index is not None:
+        commune = index.find_by_coordinates(lat, lon)
+        if commune is not None and await async_commune_contains(hass, commune["code"], lat, lon):
+            geocode_cache.set(lat, lon, commune["code"], commune["nom"], now)
+            return (commune["code"], commune["nom"], lat, lon)
+        _LOGGER.debug(f"Commune of ({lat}, {lon}) can't be told from the commune index, asking api-adresse.data.gouv.fr")
     session = async_get_clientsession(hass)
     try:
-        client = AddressAPI(session)
-        if lat is None or lon is None:
-            lon = hass.config.as_dict()["longitude"]
-            lat = hass.config.as_dict()["latitude"]
-        return await client.get_data(lat, lon)
+        client = AddressAPI(session, hass=hass)
+        insee_code, city_name, lat, lon = await client.get_data(lat, lon)
+        geocode_cache.set(lat, lon, insee_code, city_name, now)
+        return (insee_code, city_name, lat, lon)
     except ValueError as exc:
         raise exc
 
 
+def tracker_coordinates(state: Optional[State]) -> Optional[Tuple[float, float]]:
+    """Coordinates of a device_tracker or person state, None when unknown"""
+    if state is None:
+        return None
+    lat = state.attributes.get(ATTR_LATITUDE)
+    lon = state.attributes.get(ATTR_LONGITUDE)
+    if lat is None or lon is None:
+        return None
+    return (lat, lon)
+
+
 def _build_place_key(city) -> str:
     return f"{city['code']};{city['nom']};{city['centre']['coordinates'][0]};{city['centre']['coordinates'][1]}"
 
 
 class SetupConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
-    VERSION = 7
+    VERSION = 9
 
     def __init__(self):
         """Initialize"""
@@ -139,6 +196,7 @@ class SetupConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         if user_input is not None:
             location_mode = _normalize_location_mode(user_input[CONF_LOCATION_MODE])
             self.data[CONF_ZONE_TYPE] = "SUP"
+            self.data[CONF_ZONE_TYPES] = ["SUP"]
             self.data[CONF_LOCATION_MODE] = location_mode
             if location_mode == HA_COORD:
                 try:
@@ -158,6 +216,8 @@ class SetupConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 return await self.async_step_location()
             elif location_mode == SELECT_COORD:
                 return await self.async_step_map_select()
+            elif location_mode == TRACKER:
+                return await self.async_step_tracker()
 
         return self._show_setup_form("user", user_input, LOCATION_SCHEMA, errors)
 
@@ -195,6 +255,31 @@ class SetupConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 return await self.async_step_location(user_input=self.data)
         return self._show_setup_form("map_select", None, COORD_SCHEMA, errors)
 
+    async def async_step_tracker(self, user_input=None):
+        """Handle selection of the tracker entity to follow"""
+        errors = {}
+        if user_input is not None:
+            entity_id = user_input[CONF_TRACKER_ENTITY]
+            coordinates = tracker_coordinates(self.hass.states.get(entity_id))
+            if coordinates is None:
+                errors["base"] = "notracker"
+            else:
+                try:
+                    city_infos = await get_insee_code_fromcoord(self.hass, *coordinates)
+                except ValueError:
+                    errors["base"] = "noinsee"
+            if not errors:
+                self.data[CONF_TRACKER_ENTITY] = entity_id
+                self.data[CONF_INSEE_CODE] = city_infos[0]
+                self.data[CONF_CITY] = city_infos[1]
+                self.data[CONF_LATITUDE] = city_infos[2]
+                self.data[CONF_LONGITUDE] = city_infos[3]
+                # the commune changes along with the tracker
+                self.data[DEVICE_ID_KEY] = entity_id
+                self.data[CONF_FOLLOW_HA_COORDS] = False
+                return await self.async_step_location(user_input=self.data)
+        return self._show_setup_form("tracker", None, TRACKER_SCHEMA, errors)
+
     async def async_step_location(self, user_input=None):
         """Handle location step"""
         errors = {}
@@ -221,8 +306,13 @@ class SetupConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Handle zone type selection"""
         errors = {}
         if user_input is not None:
-            zone_type = user_input.get(CONF_ZONE_TYPE)
+            selected = user_input.get(CONF_ZONE_TYPES) or ["AEP"]
+            zone_types = [zone_type for zone_type in ZONE_TYPES if zone_type in selected]
+            # identifies the entry (unique ids, device name): the zone type itself when only one is tracked
+            zone_type = "+".join(zone_types)
             self.data[CONF_ZONE_TYPE] = zone_type
+            self.data[CONF_ZONE_TYPES] = zone_types
+            self.data[CONF_PROFILES] = user_input.get(CONF_PROFILES) or [DEFAULT_PROFILE]
             return self.async_create_entry(title=f"Vigieau {zone_type}", data=self.data)
         return self._show_setup_form("zone_type", None, ZONE_TYPE_SCHEMA, errors)
 
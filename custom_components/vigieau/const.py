@@ -1,7 +1,17 @@
 from homeassistant.components.sensor import SensorEntityDescription
 from dataclasses import dataclass
+from functools import lru_cache
+from datetime import timedelta
+from re import Pattern
+from typing import Optional, Tuple
+import hashlib
+import json
+import logging
+import os
 import re
 
+_LOGGER = logging.getLogger(__name__)
+
 ADDRESS_API_URL = "https://api-adresse.data.gouv.fr"
 
 CONF_CODE_POSTAL = "Code postal"
@@ -10,15 +20,20 @@ CONF_INSEE_CODE = "INSEE"
 CONF_LOCATION_MAP = "location_map"
 CONF_LOCATION_MODE = "location_mode"
 CONF_ZONE_TYPE = "zone_type"
+CONF_ZONE_TYPES = "zone_types"
 CONF_FOLLOW_HA_COORDS = "follow_ha_coords"
+CONF_PROFILES = "profiles"
+CONF_TRACKER_ENTITY = "tracker_entity_id"
 
 DEVICE_ID_KEY = "device_id"
 DOMAIN = "vigieau"
 
 GEOAPI_GOUV_URL = "https://geo.api.gouv.fr/communes?&fields=code,nom,centre"
+GEOAPI_COMMUNE_URL = "https://geo.api.gouv.fr/communes"
 HA_COORD = "ha_coord"
 ZIP_CODE = "zip_code"
 SELECT_COORD = "select_coord"
+TRACKER = "tracker"
 
 LEGACY_HA_COORD = 0
 LEGACY_ZIP_CODE = 1
@@ -28,6 +43,7 @@ LOCATION_MODES = {
     HA_COORD: "ha_coord",
     ZIP_CODE: "zip_code",
     SELECT_COORD: "select_coord",
+    TRACKER: "tracker",
 }
 
 LEVEL_COLORS = {
@@ -47,6 +63,66 @@ ZONE_TYPES = {
     "SOU": "SOU",
 }
 
+PROFILES = {
+    "particulier": "particulier",
+    "entreprise": "entreprise",
+    "collectivite": "collectivite",
+    "exploitation": "exploitation",
+}
+DEFAULT_PROFILE = "particulier"
+
+REFRESH_INTERVAL = timedelta(hours=1)
+# by numeric alert level: restrictions change rarely when there are none, and quickly during a crisis
+REFRESH_INTERVALS = {
+    0: timedelta(hours=3),
+    1: timedelta(hours=2),
+    2: REFRESH_INTERVAL,
+    3: REFRESH_INTERVAL,
+    4: timedelta(minutes=20),
+}
+
+
+# Parenthesized exclusion clauses ("(hors ...)") found in usage names
+HORS_CLAUSE_REGEX = re.compile(r"\(hors[^)]*\)")
+
+
+def usage_match_texts(usage: dict) -> Tuple[str, str]:
+    """
+    Return the texts matchers are evaluated against for a usage:
+    first with "(hors ...)" clauses stripped from the name, then verbatim.
+    Computing them once lets a usage be tested against every sensor without stripping again.
+    """
+    nom = usage["nom"]
+    thematique = usage["thematique"]
+    return (
+        HORS_CLAUSE_REGEX.sub("", nom) + "|" + thematique,
+        nom + "|" + thematique,
+    )
+
+
+def _trim_wildcards(matcher: str) -> str:
+    """
+    Drop leading and trailing ".*" from a matcher. They do not change whether re.search finds
+    a match, but a leading one makes the engine scan to the end of text from every start position.
+    """
+    if matcher.startswith(".*?"):
+        matcher = matcher[3:]
+    elif matcher.startswith(".*") and not matcher.startswith(".*+"):
+        matcher = matcher[2:]
+    if matcher.endswith(".*"):
+        # an odd number of backslashes means the dot is escaped
+        backslashes = len(matcher[:-2]) - len(matcher[:-2].rstrip("\\"))
+        if backslashes % 2 == 0:
+            matcher = matcher[:-2]
+    return matcher
+
+
+def _compile_matchers(matchers: list[str]) -> Optional[Pattern]:
+    """Compile a list of matchers into a single alternation, None if there is nothing to match"""
+    if not matchers:
+        return None
+    return re.compile("|".join(f"(?:{_trim_wildcards(matcher)})" for matcher in matchers))
+
 
 @dataclass
 class VigieEauRequiredKeysMixin:
@@ -63,15 +139,32 @@ class VigieEauSensorEntityDescription(
 ):
     """Describes VigieEau sensor entity."""
 
+    def __post_init__(self):
+        # Matchers are compiled once, when SENSOR_DEFINITIONS is built.
+        # Parenthesized exclusion clauses ("(hors ...)") are stripped before
+        # matching, unless the matcher itself contains "hors" (meaning
+        # it intentionally targets text with that keyword).
+        self._patterns = (
+            _compile_matchers(
+                [m for m in self.matchers if "hors" not in m.lower()]),
+            _compile_matchers(
+                [m for m in self.matchers if "hors" in m.lower()]),
+        )
+
     def match(self, usage: dict) -> bool:
-        for matcher in self.matchers:
-            nom = usage["nom"]
-            # Strip parenthesized exclusion clauses ("(hors ...)") before
-            # matching, unless the matcher itself contains "hors" (meaning
-            # it intentionally targets text with that keyword).
-            if "hors" not in matcher.lower():
-                nom = re.sub(r"\(hors[^)]*\)", "", nom)
-            if re.search(matcher, nom + "|" + usage["thematique"]):
+        return self.match_texts(usage_match_texts(usage))
+
+    def match_texts(self, texts: Tuple[str, str]) -> bool:
+        """Same as match, for texts already computed by usage_match_texts"""
+        known_keys = usage_lookup().get(texts[1])
+        if known_keys is not None:
+            return self.key in known_keys
+        return self.match_patterns(texts)
+
+    def match_patterns(self, texts: Tuple[str, str]) -> bool:
+        """Evaluate the matchers, ignoring the usage lookup table"""
+        for pattern, text in zip(self._patterns, texts):
+            if pattern is not None and pattern.search(text):
                 return True
         return False
 
@@ -184,7 +277,7 @@ SENSOR_DEFINITIONS: tuple[VigieEauSensorEntityDescription, ...] = (
             "Lavage des véhicules.*Nettoyer",
             "Lavage de véhicules.*Nettoyer",
             "Lavage de v.hicule(s)?( )?(chez les particuliers)?.*Nettoyer",
-            "Lavage de véhicule en station de lavage disposant d’un système équipé d’un recyclage de l’eau.*.*Nettoyer",
+            "Lavage de véhicule en station de lavage disposant d’un système équipé d’un recyclage de l’eau.*Nettoyer",
             "Lavage de tous les véhicules et engins terrestres/nautiques dans des installations professionnelles.*Nettoyer",
             ".*lavage.+particuliers.*",
             "lavage.+professionnels.+portique",
@@ -590,8 +683,8 @@ SENSOR_DEFINITIONS: tuple[VigieEauSensorEntityDescription, ...] = (
             "Irrigation des prairies de graminées à partir d'une retenue en travers de cours d'eau.*Irriguer",
             "Irrigation des prairies de graminées.*Irriguer",
             "Irrigation des grandes cultures, prairies.*Irriguer",
-            # regexp to match maraichage except if prefixed by "hors"
-            ".*(?!hors).*mara.(chage|chère).*",
+            # mentioning "hors" makes this matcher see "(hors ...)" clauses, the lookahead itself never excludes anything
+            "(?!hors)mara.(chage|chère)",
             "Irrigation des cultures par aspersion.*Irriguer",
             "Irrigation des cultures maraîchères de plein champ.*Irriguer",
             "Irrigation des cultures maraîchères.*Irriguer",
@@ -764,3 +857,43 @@ SENSOR_DEFINITIONS: tuple[VigieEauSensorEntityDescription, ...] = (
         ],
     ),
 )
+
+
+USAGE_LOOKUP_FILE = os.path.join(os.path.dirname(__file__), "usage_lookup.json")
+USAGE_LOOKUP_VERSION = 1
+
+
+def sensor_definitions_fingerprint() -> str:
+    """Digest of all matchers, a lookup table is only valid for the matchers it was generated from"""
+    matchers = [[sensor.key, sensor.matchers] for sensor in SENSOR_DEFINITIONS]
+    return hashlib.sha256(
+        json.dumps(matchers, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def load_usage_lookup(file: str = USAGE_LOOKUP_FILE) -> dict[str, frozenset]:
+    """
+    Load the table generated by scripts/generate_usage_lookup.py, mapping the verbatim
+    "nom|thematique" text of known usages to the keys of the sensors they match.
+    Returns an empty table when the file is missing or was generated for other matchers.
+    """
+    try:
+        with open(file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        _LOGGER.debug(f"Usage lookup table unavailable, relying on matchers only: {e}")
+        return {}
+    if data.get("version") != USAGE_LOOKUP_VERSION or data.get("fingerprint") != sensor_definitions_fingerprint():
+        _LOGGER.debug(
+            "Usage lookup table is outdated compared to sensor matchers, relying on matchers only")
+        return {}
+    return {text: frozenset(keys) for text, keys in data["usages"].items()}
+
+
+@lru_cache(maxsize=None)
+def usage_lookup() -> dict[str, frozenset]:
+    """
+    The usage lookup table, read on first use.
+    async_setup_entry loads it in an executor so that the event loop never waits for the file.
+    """
+    return load_usage_lookup()
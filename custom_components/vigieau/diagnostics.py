@@ -0,0 +1,33 @@
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from . import cached_classify_restrictions, cached_extract_time_range
+from .api import RATE_LIMITER, RESPONSE_CACHE
+from .const import DOMAIN
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    """Diagnostics of the refresh schedule of this entry, and of requests and parsing shared by all entries"""
+    coordinator = hass.data[DOMAIN][entry.entry_id]["vigieau_coordinator"]
+    return {
+        "refresh": {
+            "phase": coordinator.refresh_phase,
+            "scheduled_refresh_delay": coordinator.update_interval.total_seconds(),
+            "decree_end": coordinator.decree_end and coordinator.decree_end.isoformat(),
+            "last_update_success": coordinator.last_update_success,
+        },
+        "requests": {
+            "rate_per_hour": RATE_LIMITER.request_rate(),
+            "rate_limit_wait": RATE_LIMITER.waited,
+        },
+        "response_cache": {
+            "entries": len(RESPONSE_CACHE),
+            "hit_rate": RESPONSE_CACHE.hit_rate,
+        },
+        "parsing_caches": {
+            "classify_restrictions": cached_classify_restrictions.cache_info()._asdict(),
+            "extract_time_range": cached_extract_time_range.cache_info()._asdict(),
+        },
+    }
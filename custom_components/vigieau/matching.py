@@ -0,0 +1,128 @@
+from collections import deque
+from typing import Iterable, Optional, Tuple
+import re
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # python < 3.11
+    import sre_constants
+    import sre_parse
+
+from .const import (
+    SENSOR_DEFINITIONS,
+    VigieEauSensorEntityDescription,
+    usage_lookup,
+)
+
+
+def required_literal(matcher: str) -> Optional[str]:
+    """
+    Return the longest literal any text matching this matcher must contain.
+    None when no such literal can be found (the matcher has to be evaluated on every text).
+    """
+    parsed = sre_parse.parse(matcher)
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+    best = current = ""
+    # only top-level literals are required: anything nested in a group, branch or repeat may be skipped
+    for op, arg in parsed:
+        if op is sre_constants.LITERAL:
+            current += chr(arg)
+            if len(current) > len(best):
+                best = current
+        else:
+            current = ""
+    return best or None
+
+
+class LiteralAutomaton:
+    """Aho-Corasick automaton finding all literals contained in a text in a single pass"""
+
+    def __init__(self, literals: Iterable[str]):
+        self._transitions: list[dict[str, int]] = [{}]
+        self._fallbacks: list[int] = [0]
+        self._outputs: list[frozenset[str]] = [frozenset()]
+
+        for literal in set(literals):
+            state = 0
+            for char in literal:
+                if char not in self._transitions[state]:
+                    self._transitions.append({})
+                    self._fallbacks.append(0)
+                    self._outputs.append(frozenset())
+                    self._transitions[state][char] = len(self._transitions) - 1
+                state = self._transitions[state][char]
+            self._outputs[state] = frozenset([literal])
+
+        # breadth first so that fallback states are always complete when used
+        queue = deque(self._transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._transitions[state].items():
+                fallback = self._fallbacks[state]
+                while fallback and char not in self._transitions[fallback]:
+                    fallback = self._fallbacks[fallback]
+                self._fallbacks[next_state] = self._transitions[fallback].get(char, 0)
+                self._outputs[next_state] |= self._outputs[self._fallbacks[next_state]]
+                queue.append(next_state)
+
+    def find(self, text: str) -> set[str]:
+        """Return the literals found in text"""
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self._transitions[state]:
+                state = self._fallbacks[state]
+            state = self._transitions[state].get(char, 0)
+            if self._outputs[state]:
+                found |= self._outputs[state]
+        return found
+
+
+class SensorMatcher:
+    """
+    Find the sensors concerned by a usage.
+    Known usages are read from the lookup table, other ones are matched against the sensors
+    whose required literals are present in the usage texts.
+    """
+
+    def __init__(self, sensors: Iterable[VigieEauSensorEntityDescription]):
+        self._sensors = []
+        literals = []
+        for sensor in sensors:
+            # one entry per text returned by usage_match_texts: (hors-stripped, verbatim)
+            # None means at least one matcher has no literal and must always be evaluated
+            required: list[Optional[set[str]]] = [set(), set()]
+            for matcher in sensor.matchers:
+                text_index = 1 if "hors" in matcher.lower() else 0
+                literal = required_literal(matcher)
+                if literal is None:
+                    required[text_index] = None
+                elif required[text_index] is not None:
+                    required[text_index].add(literal)
+                    literals.append(literal)
+            self._sensors.append((sensor, required))
+        self._automaton = LiteralAutomaton(literals)
+
+    def sensor_keys(self, texts: Tuple[str, str]) -> Iterable[str]:
+        """Keys of sensors matching the texts computed by usage_match_texts"""
+        known_keys = usage_lookup().get(texts[1])
+        if known_keys is not None:
+            return known_keys
+        stripped_found = self._automaton.find(texts[0])
+        found = (
+            stripped_found,
+            stripped_found if texts[1] == texts[0] else self._automaton.find(texts[1]),
+        )
+        keys = []
+        for sensor, required in self._sensors:
+            candidate = any(
+                literals is None or not literals.isdisjoint(found[i])
+                for i, literals in enumerate(required)
+            )
+            if candidate and sensor.match_patterns(texts):
+                keys.append(sensor.key)
+        return keys
+
+
+SENSOR_MATCHER = SensorMatcher(SENSOR_DEFINITIONS)
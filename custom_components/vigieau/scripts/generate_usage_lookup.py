@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(".")
+sys.path.append(parent_dir)
+
+from custom_components.vigieau.const import (
+    SENSOR_DEFINITIONS,
+    USAGE_LOOKUP_FILE,
+    USAGE_LOOKUP_VERSION,
+    sensor_definitions_fingerprint,
+    usage_match_texts,
+)
+
+
+def main():
+    file = os.path.join(current_dir, "full_usage_list.json")
+    with open(file, "r", encoding="utf-8") as f:
+        restrictions = json.load(f)["restrictions"]
+
+    usages = {}
+    for restriction in restrictions:
+        texts = usage_match_texts(
+            {"nom": restriction["usage"], "thematique": restriction["thematique"]})
+        # always evaluate matchers: the table being regenerated is likely outdated
+        usages[texts[1]] = [
+            sensor.key for sensor in SENSOR_DEFINITIONS if sensor.match_patterns(texts)
+        ]
+
+    result = {
+        "version": USAGE_LOOKUP_VERSION,
+        "fingerprint": sensor_definitions_fingerprint(),
+        "usages": dict(sorted(usages.items())),
+    }
+    with open(USAGE_LOOKUP_FILE, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(f"Wrote {len(usages)} known usages to {USAGE_LOOKUP_FILE}")
+
+
+if __name__ == "__main__":
+    main()
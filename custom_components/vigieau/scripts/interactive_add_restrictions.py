@@ -63,3 +63,6 @@ for sensor_name, usages in new_matchers.items():
     for usage in usages:
         r = usage["usage"].strip() + ".*" + usage['thematique'].strip()
         insert_new_matcher(sensor_name, r)
+
+if any(new_matchers.values()):
+    print("Matchers changed, run scripts/generate_usage_lookup.py to refresh usage_lookup.json")
@@ -0,0 +1,300 @@
+from os import path
+import asyncio
+import gc
+import json
+import sys
+import unittest
+import aiohttp
+from unittest.mock import AsyncMock, MagicMock
+
+current_dir = path.dirname(__file__)
+parent_dir = path.dirname(current_dir)
+sys.path.append(".")
+sys.path.append(parent_dir)
+
+from custom_components.vigieau.api import (
+    AddressAPI,
+    IN_FLIGHT_REQUESTS,
+    RESPONSE_CACHE,
+    ResponseCache,
+    TokenBucket,
+    VigieauAPI,
+    VigieauAPIError,
+)
+
+
+def setUpModule():
+    # rate limiting is tested on its own, don't slow down other tests
+    IN_FLIGHT_REQUESTS.rate_limiter = TokenBucket(capacity=1_000)
+
+
+def _session(status, payload: bytes, headers=None):
+    resp = MagicMock()
+    resp.status = status
+    resp.headers = headers or {}
+    resp.read = AsyncMock(return_value=payload)
+    session = MagicMock()
+    session.get = AsyncMock(return_value=resp)
+    return session
+
+
+def _get_data(api, **kwargs):
+    return asyncio.run(api.get_data(45.0, 5.0, "38185", "particulier", "SUP", **kwargs))
+
+
+class TestVigieauAPI(unittest.TestCase):
+    def setUp(self):
+        RESPONSE_CACHE.clear()
+
+    def test_restrictions_decoded_once(self):
+        payload = json.dumps([{"niveauGravite": "alerte", "usages": [{"nom": "x"}]}]).encode()
+        decoder = MagicMock(side_effect=json.loads)
+        api = VigieauAPI(_session(200, payload), decoder=decoder)
+        data = _get_data(api)
+        decoder.assert_called_once_with(payload)
+        self.assertEqual(data["_numeric_state_value"], 2)
+        self.assertEqual(data["usages"], [{"nom": "x"}])
+        self.assertEqual(api.last_response.payload_size, len(payload))
+        self.assertGreaterEqual(api.last_response.decode_time, 0)
+
+    def test_no_zone_in_force(self):
+        payload = json.dumps({"message": "Aucune zone d'alerte en vigueur"}).encode()
+        data = _get_data(VigieauAPI(_session(404, payload)))
+        self.assertEqual(data["_numeric_state_value"], 0)
+        self.assertEqual(data["usages"], [])
+
+    def test_empty_list(self):
+        data = _get_data(VigieauAPI(_session(200, b"[]")))
+        self.assertEqual(data["niveauGravite"], "Pas de restrictions")
+
+    def test_server_error_not_decoded(self):
+        decoder = MagicMock()
+        with self.assertRaises(VigieauAPIError) as e:
+            _get_data(VigieauAPI(_session(500, b"<html>oops</html>"), decoder=decoder))
+        decoder.assert_not_called()
+        self.assertEqual(e.exception.text, "<html>oops</html>")
+
+    def test_invalid_json(self):
+        with self.assertRaises(VigieauAPIError):
+            _get_data(VigieauAPI(_session(200, b"<html>")))
+
+
+class TestConditionalRequests(unittest.TestCase):
+    PAYLOAD = json.dumps([{"niveauGravite": "crise", "usages": []}]).encode()
+
+    def _cached_api(self):
+        api = VigieauAPI(
+            _session(200, self.PAYLOAD, {"ETag": '"v1"', "Last-Modified": "Mon, 01 Jul 2024 00:00:00 GMT"}),
+            response_cache=None,
+        )
+        _get_data(api)
+        return api
+
+    def test_validators_are_kept(self):
+        api = self._cached_api()
+        self.assertEqual(api.cache["etag"], '"v1"')
+        self.assertEqual(api.cache["body"], json.loads(self.PAYLOAD))
+        # json serializable, to be persisted
+        json.dumps(api.cache)
+
+    def test_conditional_headers_sent(self):
+        api = VigieauAPI(_session(304, b""), cache=self._cached_api().cache, response_cache=None)
+        _get_data(api)
+        headers = api._session.get.call_args.kwargs["headers"]
+        self.assertEqual(headers["If-None-Match"], '"v1"')
+        self.assertEqual(headers["If-Modified-Since"], "Mon, 01 Jul 2024 00:00:00 GMT")
+
+    def test_not_modified_is_not_decoded(self):
+        decoder = MagicMock()
+        api = VigieauAPI(_session(304, b""), decoder=decoder, cache=self._cached_api().cache, response_cache=None)
+        self.assertEqual(_get_data(api)["niveauGravite"], "crise")
+        decoder.assert_not_called()
+        self.assertTrue(api.last_response.not_modified)
+
+    def test_not_modified_reuses_cached_body(self):
+        cache = self._cached_api().cache
+        data = _get_data(VigieauAPI(_session(304, b""), cache=cache, response_cache=None))
+        self.assertEqual(data["_numeric_state_value"], 4)
+        self.assertNotIn("_numeric_state_value", cache["body"][0])
+
+    def test_cache_ignored_for_other_url(self):
+        cache = {**self._cached_api().cache, "url": "https://example.org"}
+        api = VigieauAPI(_session(200, b"[]"), cache=cache, response_cache=None)
+        _get_data(api)
+        self.assertEqual(api._session.get.call_args.kwargs["headers"], {})
+        self.assertIsNone(api.cache)
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = ResponseCache(ttl=10, maxsize=2, clock=lambda: self.now)
+
+    def test_identical_entries_share_one_request(self):
+        payload = json.dumps([{"niveauGravite": "alerte", "usages": []}]).encode()
+        session = _session(200, payload)
+        for _ in range(3):
+            data = _get_data(VigieauAPI(session, response_cache=self.cache))
+            data["_usages_by_sensor"] = {}
+        session.get.assert_called_once()
+        self.assertAlmostEqual(self.cache.hit_rate, 2 / 3)
+        self.assertNotIn("_usages_by_sensor", _get_data(VigieauAPI(session, response_cache=self.cache)))
+
+    def test_coordinates_are_rounded(self):
+        session = _session(200, b"[]")
+        api = VigieauAPI(session, response_cache=self.cache)
+        asyncio.run(api.get_data(45.000001, 5.0, "38185", "particulier", "SUP"))
+        asyncio.run(api.get_data(45.000002, 5.0, "38185", "particulier", "SUP"))
+        asyncio.run(api.get_data(45.000002, 5.0, "38185", "particulier", "AEP"))
+        self.assertEqual(session.get.call_count, 2)
+
+    def test_fresh_request_replaces_cached_response(self):
+        session = _session(200, json.dumps([{"niveauGravite": "alerte", "usages": []}]).encode())
+        _get_data(VigieauAPI(session, response_cache=self.cache))
+        session.get.return_value.read.return_value = b"[]"
+        data = asyncio.run(VigieauAPI(session, response_cache=self.cache).get_data(
+            45.0, 5.0, "38185", "particulier", "SUP", fresh=True))
+        self.assertEqual(data["niveauGravite"], "Pas de restrictions")
+        self.assertEqual(_get_data(VigieauAPI(session, response_cache=self.cache))["niveauGravite"], "Pas de restrictions")
+        self.assertEqual(session.get.call_count, 2)
+
+    def test_expiration(self):
+        self.cache.set("k", 1)
+        self.now = 9
+        self.assertEqual(self.cache.get("k"), 1)
+        self.now = 10
+        self.assertIsNone(self.cache.get("k"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_evicted(self):
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+
+
+def _slow_session(status, payload: bytes):
+    """A session whose requests only complete once every caller had a chance to join them"""
+    session = _session(status, payload)
+    response = session.get.return_value
+
+    async def get(url, headers=None, timeout=None):
+        await asyncio.sleep(0)
+        return response
+
+    session.get = AsyncMock(side_effect=get)
+    return session
+
+
+class TestInFlightRequests(unittest.TestCase):
+    def test_concurrent_identical_requests_are_coalesced(self):
+        session = _slow_session(200, json.dumps([{"niveauGravite": "vigilance", "usages": []}]).encode())
+
+        async def run():
+            apis = [VigieauAPI(session, response_cache=None) for _ in range(5)]
+            return await asyncio.gather(*[api.get_data(45.0, 5.0, "38185", "particulier", "SUP") for api in apis])
+
+        results = asyncio.run(run())
+        session.get.assert_called_once()
+        self.assertEqual({r["niveauGravite"] for r in results}, {"vigilance"})
+        self.assertEqual(len(IN_FLIGHT_REQUESTS), 0)
+
+    def test_different_urls_are_not_coalesced(self):
+        session = _slow_session(200, b"[]")
+
+        async def run():
+            api = VigieauAPI(session, response_cache=None)
+            await asyncio.gather(
+                api.get_data(45.0, 5.0, "38185", "particulier", "SUP"),
+                api.get_data(45.0, 5.0, "38185", "particulier", "AEP"),
+            )
+
+        asyncio.run(run())
+        self.assertEqual(session.get.call_count, 2)
+
+    def test_timeout_passed_to_session(self):
+        session = _session(200, b"[]")
+        _get_data(VigieauAPI(session, timeout=aiohttp.ClientTimeout(total=5), response_cache=None))
+        self.assertEqual(session.get.call_args.kwargs["timeout"], aiohttp.ClientTimeout(total=5))
+
+    def test_request_is_a_hass_background_task(self):
+        session = _session(200, b"[]")
+        hass = MagicMock()
+        hass.async_create_background_task.side_effect = lambda target, name: asyncio.ensure_future(target)
+        _get_data(VigieauAPI(session, response_cache=None, hass=hass))
+        hass.async_create_background_task.assert_called_once()
+        session.get.assert_called_once()
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        payload = json.dumps({"features": [{"properties": {"citycode": "38185", "city": "Grenoble"}}]}).encode()
+        session = _slow_session(200, payload)
+
+        async def run():
+            first = asyncio.ensure_future(AddressAPI(session).get_data(45.0, 5.0))
+            second = asyncio.ensure_future(AddressAPI(session).get_data(45.0, 5.0))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(run()), ("38185", "Grenoble", 45.0, 5.0))
+        session.get.assert_called_once()
+
+    def test_failure_without_callers_is_retrieved(self):
+        session = _slow_session(200, b"[]")
+        session.get.side_effect = aiohttp.ClientConnectionError()
+        unretrieved = []
+
+        async def run():
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: unretrieved.append(context))
+            caller = asyncio.ensure_future(AddressAPI(session).get_data(45.0, 5.0))
+            await asyncio.sleep(0)
+            caller.cancel()
+            await asyncio.sleep(0.01)
+            gc.collect()
+
+        asyncio.run(run())
+        self.assertEqual(unretrieved, [])
+
+
+class TestTokenBucket(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+
+        async def sleep(delay):
+            self.now += delay
+
+        self.bucket = TokenBucket(rate=2, capacity=3, clock=lambda: self.now, sleep=sleep)
+
+    def _acquire(self, count):
+        async def run():
+            for _ in range(count):
+                await self.bucket.acquire()
+
+        asyncio.run(run())
+
+    def test_burst_then_rate(self):
+        self._acquire(3)
+        self.assertEqual(self.now, 0)
+        self._acquire(4)
+        self.assertEqual(self.now, 2)
+        self.assertEqual(self.bucket.waited, 2)
+
+    def test_tokens_refill_up_to_capacity(self):
+        self._acquire(3)
+        self.now = 100
+        self._acquire(3)
+        self.assertEqual(self.now, 100)
+        self._acquire(1)
+        self.assertEqual(self.now, 100.5)
+
+    def test_request_rate(self):
+        self._acquire(3)
+        self.assertEqual(self.bucket.request_rate(), 3)
+        self.now = 3601
+        self.assertEqual(self.bucket.request_rate(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,284 @@
+from os import path
+import asyncio
+import json
+import math
+import random
+import sys
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+current_dir = path.dirname(__file__)
+parent_dir = path.dirname(current_dir)
+sys.path.append(".")
+sys.path.append(parent_dir)
+
+from custom_components.vigieau.api import InseeAPIError
+from custom_components.vigieau.communes import (
+    COMMUNE_INDEX_RETRY_DELAY,
+    COMMUNE_INDEX_TTL,
+    CommuneArea,
+    GEOCODE_CACHE_SIZE,
+    GEOCODE_CACHE_TTL,
+    KM_PER_DEGREE,
+    MAX_COMMUNE_DISTANCE,
+    CommuneIndex,
+    GeocodeCache,
+    async_get_commune_index,
+    async_get_geocode_cache,
+)
+from custom_components.vigieau.config_flow import get_insee_code_fromcoord
+
+COMMUNES = [
+    {"code": "38185", "nom": "Grenoble", "centre": {"type": "Point", "coordinates": [5.7224, 45.1842]}, "codesPostaux": ["38000", "38100"]},
+    {"code": "38421", "nom": "Saint-Martin-d'Hères", "centre": {"type": "Point", "coordinates": [5.7653, 45.1672]}, "codesPostaux": ["38400"]},
+    {"code": "38151", "nom": "Gières", "centre": {"type": "Point", "coordinates": [5.7917, 45.1814]}, "codesPostaux": ["38610"]},
+    {"code": "38423", "nom": "Saint-Martin-d'Uriage", "centre": {"type": "Point", "coordinates": [5.8407, 45.1527]}, "codesPostaux": ["38410"]},
+    {"code": "38516", "nom": "Vaulnaveys-le-Haut", "centre": {"type": "Point", "coordinates": [5.8167, 45.1167]}, "codesPostaux": ["38410"]},
+    {"code": "55039", "nom": "Beaumont-en-Verdunois", "centre": None, "codesPostaux": []},
+]
+
+
+class TestCommuneIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = CommuneIndex.from_communes(COMMUNES, updated_at=0)
+
+    def test_communes_without_centre_skipped(self):
+        self.assertEqual(len(self.index), 5)
+
+    def test_find_by_postal_code(self):
+        self.assertEqual(
+            self.index.find_by_postal_code("38100"),
+            [{"code": "38185", "nom": "Grenoble", "centre": {"type": "Point", "coordinates": [5.7224, 45.1842]}}],
+        )
+        self.assertEqual([c["code"] for c in self.index.find_by_postal_code(" 38410")], ["38423", "38516"])
+        self.assertEqual(self.index.find_by_postal_code("75001"), [])
+
+    def test_storage_round_trip(self):
+        restored = CommuneIndex.from_dict(self.index.as_dict())
+        self.assertEqual(restored.find_by_postal_code("38400"), self.index.find_by_postal_code("38400"))
+
+    def test_staleness(self):
+        self.assertFalse(self.index.is_stale(COMMUNE_INDEX_TTL.total_seconds()))
+        self.assertTrue(self.index.is_stale(COMMUNE_INDEX_TTL.total_seconds() + 1))
+
+
+class TestReverseGeocoding(unittest.TestCase):
+    def setUp(self):
+        self.index = CommuneIndex.from_communes(COMMUNES, updated_at=0)
+
+    def test_point_close_to_a_centre(self):
+        self.assertEqual(self.index.find_by_coordinates(45.1850, 5.7200)["code"], "38185")
+        self.assertEqual(self.index.find_by_coordinates(45.1530, 5.8400)["nom"], "Saint-Martin-d'Uriage")
+
+    def test_point_near_a_border_is_ambiguous(self):
+        # half way between Grenoble and Saint-Martin-d'Hères centres
+        self.assertIsNone(self.index.find_by_coordinates(45.1757, 5.7438))
+
+    def test_point_far_from_any_centre(self):
+        self.assertEqual(self.index.nearest(48.8566, 2.3522), [])
+        self.assertIsNone(self.index.find_by_coordinates(48.8566, 2.3522))
+
+    def test_nearest_agrees_with_exhaustive_search(self):
+        rng = random.Random(42)
+        communes = [
+            {"code": str(i), "nom": str(i), "centre": {"coordinates": [rng.uniform(4, 7), rng.uniform(44, 46)]}}
+            for i in range(2000)
+        ]
+        index = CommuneIndex.from_communes(communes, updated_at=0)
+        for _ in range(200):
+            lat, lon = rng.uniform(43.8, 46.2), rng.uniform(3.8, 7.2)
+            distances = sorted(
+                KM_PER_DEGREE * math.hypot(c["centre"]["coordinates"][1] - lat, (c["centre"]["coordinates"][0] - lon) * math.cos(math.radians(lat)))
+                for c in communes
+            )
+            expected = [d for d in distances[:2] if d <= MAX_COMMUNE_DISTANCE]
+            self.assertEqual([d for d, _ in index.nearest(lat, lon)], expected)
+
+
+SQUARE = [[5.0, 45.0], [6.0, 45.0], [6.0, 46.0], [5.0, 46.0], [5.0, 45.0]]
+HOLE = [[5.4, 45.4], [5.6, 45.4], [5.6, 45.6], [5.4, 45.6], [5.4, 45.4]]
+
+
+class TestCommuneArea(unittest.TestCase):
+    def test_polygon(self):
+        area = CommuneArea.from_geojson({"type": "Polygon", "coordinates": [SQUARE]})
+        self.assertEqual(area.bbox, (45.0, 5.0, 46.0, 6.0))
+        self.assertTrue(area.contains(45.2, 5.8))
+        self.assertFalse(area.contains(45.2, 6.1))
+        self.assertFalse(area.contains(44.9, 5.5))
+
+    def test_enclave_excluded(self):
+        area = CommuneArea.from_geojson({"type": "Polygon", "coordinates": [SQUARE, HOLE]})
+        self.assertFalse(area.contains(45.5, 5.5))
+        self.assertTrue(area.contains(45.3, 5.5))
+
+    def test_multipolygon(self):
+        island = [[7.0, 47.0], [7.5, 47.0], [7.5, 47.5], [7.0, 47.0]]
+        area = CommuneArea.from_geojson({"type": "MultiPolygon", "coordinates": [[SQUARE], [island]]})
+        self.assertTrue(area.contains(47.1, 7.4))
+        self.assertTrue(area.contains(45.5, 5.5))
+        self.assertFalse(area.contains(46.5, 6.5))
+
+    def test_unsupported_geometry(self):
+        with self.assertRaises(ValueError):
+            CommuneArea.from_geojson({"type": "Point", "coordinates": [5.0, 45.0]})
+
+    def test_storage_round_trip(self):
+        area = CommuneArea.from_geojson({"type": "Polygon", "coordinates": [SQUARE, HOLE]})
+        restored = CommuneArea.from_dict(area.as_dict())
+        self.assertEqual(restored.bbox, area.bbox)
+        self.assertFalse(restored.contains(45.5, 5.5))
+
+
+GRENOBLE_CONTOUR = {"type": "Polygon", "coordinates": [[[5.68, 45.15], [5.75, 45.15], [5.75, 45.21], [5.68, 45.21], [5.68, 45.15]]]}
+
+
+class TestGetInseeCodeFromCoord(unittest.TestCase):
+    def setUp(self):
+        self.index = CommuneIndex.from_communes(COMMUNES, updated_at=0)
+        self.address_api = MagicMock()
+        self.address_api.return_value.get_data = AsyncMock(return_value=("38421", "Saint-Martin-d'Hères", 45.1757, 5.7438))
+        self.geocode_cache = GeocodeCache(MagicMock())
+        self.insee_api = MagicMock()
+        self.insee_api.return_value.get_contour = AsyncMock(return_value=GRENOBLE_CONTOUR)
+        patches = [
+            patch("custom_components.vigieau.communes.InseeAPI", self.insee_api),
+            patch("custom_components.vigieau.communes.async_get_clientsession", MagicMock()),
+            patch("custom_components.vigieau.config_flow.async_get_geocode_cache", AsyncMock(return_value=self.geocode_cache)),
+            patch("custom_components.vigieau.config_flow.async_get_commune_index", AsyncMock(return_value=self.index)),
+            patch("custom_components.vigieau.config_flow.AddressAPI", self.address_api),
+            patch("custom_components.vigieau.config_flow.async_get_clientsession", MagicMock()),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def test_resolved_locally(self):
+        result = asyncio.run(get_insee_code_fromcoord(MagicMock(), 45.1850, 5.7200))
+        self.assertEqual(result, ("38185", "Grenoble", 45.1850, 5.7200))
+        self.address_api.return_value.get_data.assert_not_called()
+        self.insee_api.return_value.get_contour.assert_called_once_with("38185")
+
+    def test_nearest_centre_outside_contour(self):
+        # closer to Grenoble centre, but in the part of Saint-Martin-d'Hères reaching west
+        self.insee_api.return_value.get_contour.return_value = {
+            "type": "Polygon", "coordinates": [[[5.70, 45.18], [5.74, 45.18], [5.74, 45.20], [5.70, 45.20], [5.70, 45.18]]]}
+        result = asyncio.run(get_insee_code_fromcoord(MagicMock(), 45.1757, 5.7300))
+        self.assertEqual(result[0], "38421")
+        self.address_api.return_value.get_data.assert_called_once()
+
+    def test_contour_unavailable(self):
+        self.insee_api.return_value.get_contour.side_effect = InseeAPIError("down")
+        asyncio.run(get_insee_code_fromcoord(MagicMock(), 45.1850, 5.7200))
+        self.address_api.return_value.get_data.assert_called_once()
+
+    def test_border_points_use_address_api(self):
+        result = asyncio.run(get_insee_code_fromcoord(MagicMock(), 45.1757, 5.7438))
+        self.assertEqual(result[0], "38421")
+        self.address_api.return_value.get_data.assert_called_once_with(45.1757, 5.7438)
+
+    def test_address_api_results_are_cached(self):
+        asyncio.run(get_insee_code_fromcoord(MagicMock(), 45.1757, 5.7438))
+        result = asyncio.run(get_insee_code_fromcoord(MagicMock(), 45.17571, 5.74379))
+        self.assertEqual(result, ("38421", "Saint-Martin-d'Hères", 45.17571, 5.74379))
+        self.address_api.return_value.get_data.assert_called_once()
+
+
+class TestGeocodeCache(unittest.TestCase):
+    def setUp(self):
+        self.store = MagicMock()
+        self.cache = GeocodeCache(self.store)
+
+    def test_rounded_coordinates(self):
+        self.cache.set(45.18421, 5.72239, "38185", "Grenoble", now=0)
+        self.assertEqual(self.cache.get(45.18419, 5.72241, now=0), ("38185", "Grenoble"))
+        self.assertIsNone(self.cache.get(45.1852, 5.7224, now=0))
+        self.store.async_delay_save.assert_called()
+
+    def test_expiration(self):
+        self.cache.set(45.0, 5.0, "38185", "Grenoble", now=0)
+        ttl = GEOCODE_CACHE_TTL.total_seconds()
+        self.assertIsNotNone(self.cache.get(45.0, 5.0, now=ttl))
+        self.assertIsNone(self.cache.get(45.0, 5.0, now=ttl + 1))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_least_recently_used_evicted(self):
+        for i in range(GEOCODE_CACHE_SIZE):
+            self.cache.set(45.0, i / 100, str(i), str(i), now=0)
+        self.cache.get(45.0, 0, now=0)
+        self.cache.set(46.0, 0, "new", "new", now=0)
+        self.assertEqual(len(self.cache), GEOCODE_CACHE_SIZE)
+        self.assertIsNotNone(self.cache.get(45.0, 0, now=0))
+        self.assertIsNone(self.cache.get(45.0, 0.01, now=0))
+
+    def test_loaded_from_storage(self):
+        hass = MagicMock()
+        hass.data = {}
+        store = MagicMock()
+        store.async_load = AsyncMock(return_value={"entries": {"45.0,5.0": [0, "38185", "Grenoble"]}})
+        with patch("custom_components.vigieau.communes.Store", return_value=store):
+            cache = asyncio.run(async_get_geocode_cache(hass))
+            self.assertIs(asyncio.run(async_get_geocode_cache(hass)), cache)
+        self.assertEqual(cache.get(45.0, 5.0, now=0), ("38185", "Grenoble"))
+        store.async_load.assert_called_once()
+
+
+class TestGetCommuneIndex(unittest.TestCase):
+    def setUp(self):
+        self.hass = MagicMock()
+        self.hass.data = {}
+        self.hass.async_add_executor_job = AsyncMock(side_effect=lambda target, *args: target(*args))
+        self.store = MagicMock()
+        self.store.async_load = AsyncMock(return_value=None)
+        self.store.async_save = AsyncMock()
+        self.insee_api = MagicMock()
+        self.insee_api.return_value.get_insee_list_payload = AsyncMock(return_value=json.dumps(COMMUNES).encode())
+        patches = [
+            patch("custom_components.vigieau.communes.Store", return_value=self.store),
+            patch("custom_components.vigieau.communes.InseeAPI", self.insee_api),
+            patch("custom_components.vigieau.communes.async_get_clientsession", MagicMock()),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _get_index(self):
+        return asyncio.run(async_get_commune_index(self.hass))
+
+    def test_downloaded_once(self):
+        self.assertEqual(len(self._get_index()), 5)
+        self.assertEqual(len(self._get_index()), 5)
+        self.insee_api.return_value.get_insee_list_payload.assert_called_once()
+        self.hass.async_add_executor_job.assert_called_once()
+        self.store.async_save.assert_called_once()
+
+    def test_stored_index_used(self):
+        with patch("custom_components.vigieau.communes.dt_util.utcnow") as utcnow:
+            utcnow.return_value.timestamp.return_value = 1000
+            self.store.async_load.return_value = CommuneIndex.from_communes(COMMUNES[:1], 0).as_dict()
+            self.assertEqual(len(self._get_index()), 1)
+        self.insee_api.return_value.get_insee_list_payload.assert_not_called()
+
+    def test_stale_index_kept_when_download_fails(self):
+        self.store.async_load.return_value = CommuneIndex.from_communes(COMMUNES[:1], 0).as_dict()
+        self.insee_api.return_value.get_insee_list_payload.side_effect = InseeAPIError("down")
+        self.assertEqual(len(self._get_index()), 1)
+
+    def test_no_index_available(self):
+        self.insee_api.return_value.get_insee_list_payload.side_effect = InseeAPIError("down")
+        self.assertIsNone(self._get_index())
+
+    def test_failed_download_not_retried_right_away(self):
+        self.insee_api.return_value.get_insee_list_payload.side_effect = InseeAPIError("down")
+        with patch("custom_components.vigieau.communes.dt_util.utcnow") as utcnow:
+            utcnow.return_value.timestamp.return_value = 1000
+            self.assertIsNone(self._get_index())
+            self.assertIsNone(self._get_index())
+            self.insee_api.return_value.get_insee_list_payload.assert_called_once()
+            self.insee_api.return_value.get_insee_list_payload.side_effect = None
+            utcnow.return_value.timestamp.return_value = 1001 + COMMUNE_INDEX_RETRY_DELAY.total_seconds()
+            self.assertEqual(len(self._get_index()), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
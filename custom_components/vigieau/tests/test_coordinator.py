@@ -0,0 +1,535 @@
+from datetime import datetime, timedelta, timezone
+from os import path
+import asyncio
+import sys
+import aiohttp
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+current_dir = path.dirname(__file__)
+parent_dir = path.dirname(current_dir)
+sys.path.append(".")
+sys.path.append(parent_dir)
+
+from custom_components.vigieau.__init__ import (
+    COMMUNE_AREA_KEY,
+    DECREE_END_SPREAD,
+    HTTP_CACHE_KEY,
+    MAX_CONCURRENT_REQUESTS,
+    MIN_REFRESH_DELAY,
+    REFRESH_INTERVAL,
+    RETRY_INTERVAL,
+    VigieauAPICoordinator,
+    async_migrate_entry,
+    decree_end,
+    merge_restrictions,
+    refresh_phase,
+    usage_label,
+)
+from custom_components.vigieau.api import AddressAPIError, DecodedResponse
+from custom_components.vigieau.const import PROFILES
+from custom_components.vigieau.diagnostics import async_get_config_entry_diagnostics
+# diagnostics.py imports the package itself, not custom_components.vigieau.__init__ as the tests do
+from custom_components.vigieau import cached_classify_restrictions
+from homeassistant.helpers.update_coordinator import UpdateFailed
+
+LOCATION = {
+    "latitude": 45.0,
+    "longitude": 5.0,
+    "INSEE": "38185",
+    "city": "Grenoble",
+    "zone_type": "SUP",
+}
+
+GARDEN = {"nom": "Arrosage des jardins potagers", "thematique": "Arroser"}
+POOL = {"nom": "Remplissage des piscines privées", "thematique": "Remplir"}
+FIELDS = {"nom": "Irrigation des cultures", "thematique": "Irriguer"}
+
+
+def _restrictions(level, numeric, usages):
+    return {"niveauGravite": level, "usages": usages, "arrete": {}, "_numeric_state_value": numeric}
+
+
+class FakeVigieauAPI:
+    """Replies with canned restrictions per profile, tracking concurrency"""
+
+    responses = {}
+    not_modified = False
+    fresh = False
+    running = 0
+    max_running = 0
+    calls = []
+
+    def __init__(self, session, cache=None, hass=None):
+        self.cache = cache
+        self.last_response = None
+
+    async def get_data(self, lat, long, insee_code, profil, zone_type, fresh=False):
+        FakeVigieauAPI.calls.append((profil, zone_type))
+        FakeVigieauAPI.fresh = fresh
+        FakeVigieauAPI.running += 1
+        FakeVigieauAPI.max_running = max(FakeVigieauAPI.max_running, FakeVigieauAPI.running)
+        await asyncio.sleep(0)
+        FakeVigieauAPI.running -= 1
+        self.last_response = DecodedResponse(200, None, 0, 0, not_modified=FakeVigieauAPI.not_modified)
+        if not FakeVigieauAPI.not_modified:
+            self.cache = {"url": profil, "etag": profil}
+        responses = FakeVigieauAPI.responses
+        return dict(responses.get((profil, zone_type)) or responses[profil])
+
+
+def _coordinator(profiles, zone_types=("SUP",), location=LOCATION):
+    config = {**location, "follow_ha_coords": False, "profiles": profiles, "zone_types": list(zone_types)}
+    coordinator = VigieauAPICoordinator(MagicMock(), config, "entry")
+    coordinator._custom_store = MagicMock()
+    coordinator._custom_store.async_load = AsyncMock(return_value=dict(location))
+    coordinator._custom_store.async_delay_save = MagicMock()
+    return coordinator
+
+
+def _saved_location(coordinator):
+    data_to_save = coordinator._custom_store.async_delay_save.call_args.args[0]
+    return data_to_save()
+
+
+@patch("custom_components.vigieau.__init__.async_get_clientsession", MagicMock())
+@patch("custom_components.vigieau.__init__.VigieauAPI", FakeVigieauAPI)
+class TestMultipleProfiles(unittest.TestCase):
+    def setUp(self):
+        FakeVigieauAPI.responses = {
+            "particulier": _restrictions("alerte", 2, [GARDEN, POOL]),
+            "entreprise": _restrictions("vigilance", 1, []),
+            "collectivite": _restrictions("alerte", 2, [dict(GARDEN)]),
+            "exploitation": _restrictions("crise", 4, [FIELDS]),
+        }
+        FakeVigieauAPI.not_modified = False
+        FakeVigieauAPI.max_running = 0
+        FakeVigieauAPI.calls = []
+
+    def test_usages_of_all_profiles_are_merged(self):
+        data = asyncio.run(_coordinator(["particulier", "collectivite", "exploitation"]).update_method())
+        self.assertEqual(data["niveauGravite"], "crise")
+        self.assertEqual(data["usages"], [GARDEN, POOL, FIELDS])
+        self.assertEqual(data["_usages_by_sensor"]["potagers"], [GARDEN])
+
+    def test_requests_are_bounded(self):
+        asyncio.run(_coordinator(list(PROFILES) * 2).update_method())
+        self.assertEqual(FakeVigieauAPI.max_running, MAX_CONCURRENT_REQUESTS)
+
+    def test_validators_stored_per_profile(self):
+        coordinator = _coordinator(["particulier", "entreprise"])
+        asyncio.run(coordinator.update_method())
+        saved = _saved_location(coordinator)
+        self.assertEqual(set(saved[HTTP_CACHE_KEY]), {"particulier/SUP", "entreprise/SUP"})
+        self.assertEqual(saved["INSEE"], "38185")
+
+    def test_unchanged_data_is_kept(self):
+        coordinator = _coordinator(["particulier", "entreprise"])
+        coordinator.data = previous = _restrictions("alerte", 2, [])
+        FakeVigieauAPI.not_modified = True
+        self.assertIs(asyncio.run(coordinator.update_method()), previous)
+        coordinator._custom_store.async_delay_save.assert_not_called()
+
+    def test_zone_types_fetched_in_one_cycle(self):
+        FakeVigieauAPI.responses[("particulier", "AEP")] = _restrictions("alerte_renforcee", 3, [FIELDS])
+        coordinator = _coordinator(["particulier"], ["SUP", "AEP", "SOU"])
+        data = asyncio.run(coordinator.update_method())
+        self.assertEqual(
+            sorted(FakeVigieauAPI.calls),
+            [("particulier", "AEP"), ("particulier", "SOU"), ("particulier", "SUP")],
+        )
+        self.assertEqual(data["niveauGravite"], "alerte_renforcee")
+        # usages of different zone types are kept apart, even when identical
+        self.assertEqual(
+            [(u["nom"], u["_zone_type"]) for u in data["usages"]],
+            [(GARDEN["nom"], "SUP"), (POOL["nom"], "SUP"), (FIELDS["nom"], "AEP"), (GARDEN["nom"], "SOU"), (POOL["nom"], "SOU")],
+        )
+
+    def test_next_refresh_scheduled_on_entry_slot(self):
+        coordinator = _coordinator(["particulier"])
+        asyncio.run(coordinator.update_method())
+        self.assertGreater(coordinator.update_interval, timedelta(0))
+        self.assertLessEqual(coordinator.update_interval, REFRESH_INTERVAL * 1.25)
+
+    def _refresh_delay(self, **kwargs):
+        coordinator = _coordinator(["particulier"])
+        coordinator.refresh_phase = 0.5
+        now = datetime(2024, 7, 1, 10, 0, tzinfo=timezone.utc)
+        with patch("custom_components.vigieau.__init__.dt_util.utcnow", return_value=now):
+            data = asyncio.run(coordinator.update_method())
+        return coordinator.update_interval, data
+
+    def test_poll_less_without_restrictions(self):
+        FakeVigieauAPI.responses["particulier"] = _restrictions("Pas de restrictions", 0, [])
+        # slot at 1h30 in every 3 hours, the one 30 minutes away is too close
+        self.assertEqual(self._refresh_delay()[0], timedelta(hours=3, minutes=30))
+
+    def test_poll_more_during_crisis(self):
+        FakeVigieauAPI.responses["particulier"] = _restrictions("crise", 4, [])
+        # slot at 10 past every 20 minutes
+        self.assertEqual(self._refresh_delay()[0], timedelta(minutes=10))
+
+    def test_refresh_when_decree_expires(self):
+        FakeVigieauAPI.responses["particulier"] = {
+            **_restrictions("alerte", 2, []),
+            "arrete": {"dateFinValidite": "2024-07-01"},
+        }
+        # end of day in Paris is 22:00 UTC, after the next slot
+        self.assertEqual(self._refresh_delay()[0], timedelta(minutes=30))
+        FakeVigieauAPI.responses["particulier"]["arrete"]["dateFinValidite"] = "2024-07-01T10:20:00+02:00"
+        self.assertEqual(self._refresh_delay()[0], timedelta(minutes=30))
+        FakeVigieauAPI.responses["particulier"]["arrete"]["dateFinValidite"] = "2024-07-01T12:20:00+02:00"
+        # spread by the entry phase after the end of the decree
+        self.assertEqual(self._refresh_delay()[0], timedelta(minutes=20) + DECREE_END_SPREAD / 2)
+
+    def test_decree_end_delay_has_a_floor(self):
+        FakeVigieauAPI.responses["particulier"] = {
+            **_restrictions("alerte", 2, []),
+            "arrete": {"dateFinValidite": "2024-07-01T12:00:05+02:00"},
+        }
+        self.assertEqual(self._refresh_delay()[0], timedelta(seconds=MIN_REFRESH_DELAY) + DECREE_END_SPREAD / 2)
+
+    def test_retry_interval_after_failure(self):
+        FakeVigieauAPI.responses["particulier"] = _restrictions("Pas de restrictions", 0, [])
+        coordinator = _coordinator(["particulier"])
+        asyncio.run(coordinator.update_method())
+        FakeVigieauAPI.responses = {}
+        with self.assertRaises(UpdateFailed):
+            asyncio.run(coordinator.update_method())
+        self.assertEqual(coordinator.update_interval, RETRY_INTERVAL)
+
+    def test_expired_decree_fetched_fresh(self):
+        coordinator = _coordinator(["particulier"])
+        asyncio.run(coordinator.update_method())
+        self.assertFalse(FakeVigieauAPI.fresh)
+        coordinator.decree_end = datetime(2024, 7, 1, 22, 0, tzinfo=timezone.utc)
+        asyncio.run(coordinator.update_method())
+        self.assertTrue(FakeVigieauAPI.fresh)
+
+    def test_earliest_decree_end_across_profiles(self):
+        FakeVigieauAPI.responses["particulier"]["arrete"] = {"dateFinValidite": "2024-07-02"}
+        FakeVigieauAPI.responses["exploitation"]["arrete"] = {"dateFinValidite": "2024-07-01"}
+        coordinator = _coordinator(["particulier", "exploitation"])
+        asyncio.run(coordinator.update_method())
+        self.assertEqual(coordinator.decree_end, datetime(2024, 7, 1, 22, 0, tzinfo=timezone.utc))
+
+
+class TestDecreeEnd(unittest.TestCase):
+    def test_date_is_valid_until_end_of_day(self):
+        self.assertEqual(
+            decree_end({"arrete": {"dateFinValidite": "2024-12-31"}}),
+            datetime(2024, 12, 31, 23, 0, tzinfo=timezone.utc),
+        )
+
+    def test_unknown_end(self):
+        self.assertIsNone(decree_end({"arrete": {}}))
+        self.assertIsNone(decree_end({"arrete": {"dateFinValidite": None}}))
+        self.assertIsNone(decree_end({}))
+        self.assertIsNone(decree_end({"arrete": {"dateFinValidite": "bientôt"}}))
+
+
+@patch("custom_components.vigieau.__init__.async_get_clientsession", MagicMock())
+@patch("custom_components.vigieau.__init__.VigieauAPI", FakeVigieauAPI)
+class TestLocation(unittest.TestCase):
+    def setUp(self):
+        FakeVigieauAPI.responses = {"particulier": _restrictions("alerte", 2, [])}
+        FakeVigieauAPI.not_modified = False
+        FakeVigieauAPI.calls = []
+
+    def test_location_loaded_once(self):
+        coordinator = _coordinator(["particulier"])
+        for _ in range(3):
+            asyncio.run(coordinator.update_method())
+        coordinator._custom_store.async_load.assert_called_once()
+
+    def test_first_save(self):
+        coordinator = _coordinator(["particulier"])
+        coordinator._custom_store.async_load.return_value = None
+        asyncio.run(coordinator.async_load_location())
+        self.assertEqual(_saved_location(coordinator), LOCATION)
+        self.assertEqual(coordinator.location(), LOCATION)
+
+    def _following_coordinator(self):
+        coordinator = _coordinator(["particulier"])
+        coordinator.config["follow_ha_coords"] = True
+        coordinator.hass.config.latitude = 45.0
+        coordinator.hass.config.longitude = 5.0
+        coordinator.async_refresh = AsyncMock()
+        asyncio.run(coordinator.async_load_location())
+        return coordinator
+
+    def _move(self, coordinator, geocode):
+        coordinator.hass.config.latitude = 45.1842
+        coordinator.hass.config.longitude = 5.7224
+        with patch("custom_components.vigieau.__init__.get_insee_code_fromcoord", geocode):
+            asyncio.run(coordinator.async_core_config_updated(MagicMock()))
+
+    def test_move_while_stopped(self):
+        coordinator = _coordinator(["particulier"])
+        coordinator.config["follow_ha_coords"] = True
+        coordinator.hass.config.latitude = 45.1842
+        coordinator.hass.config.longitude = 5.7224
+        geocode = AsyncMock(return_value=("38421", "Saint-Martin-d'Hères", 45.1842, 5.7224))
+        with patch("custom_components.vigieau.__init__.get_insee_code_fromcoord", geocode):
+            asyncio.run(coordinator.async_load_location())
+        self.assertEqual(coordinator.location()["INSEE"], "38421")
+
+    def test_follow_ha_coordinates(self):
+        coordinator = self._following_coordinator()
+        geocode = AsyncMock(return_value=("38421", "Saint-Martin-d'Hères", 45.1842, 5.7224))
+        self._move(coordinator, geocode)
+        geocode.assert_called_once()
+        coordinator.async_refresh.assert_called_once()
+        self.assertEqual(coordinator.location()["INSEE"], "38421")
+        self.assertEqual(_saved_location(coordinator)["city"], "Saint-Martin-d'Hères")
+
+    def test_other_config_changes_ignored(self):
+        coordinator = self._following_coordinator()
+        geocode = AsyncMock()
+        with patch("custom_components.vigieau.__init__.get_insee_code_fromcoord", geocode):
+            asyncio.run(coordinator.async_core_config_updated(MagicMock()))
+        geocode.assert_not_called()
+        coordinator.async_refresh.assert_not_called()
+
+    def test_refresh_does_not_check_location(self):
+        coordinator = self._following_coordinator()
+        coordinator.hass.config.latitude = 46.0
+        geocode = AsyncMock()
+        with patch("custom_components.vigieau.__init__.get_insee_code_fromcoord", geocode):
+            asyncio.run(coordinator.update_method())
+        geocode.assert_not_called()
+
+    def test_location_kept_when_geocoding_fails(self):
+        coordinator = self._following_coordinator()
+        self._move(coordinator, AsyncMock(side_effect=ValueError))
+        self.assertEqual(coordinator.location()["INSEE"], "38185")
+        coordinator.async_refresh.assert_not_called()
+
+    def test_geocoding_network_errors_retried_on_update(self):
+        coordinator = _coordinator(["particulier"])
+        coordinator.config["follow_ha_coords"] = True
+        coordinator.hass.config.latitude = 45.1842
+        coordinator.hass.config.longitude = 5.7224
+        for error in (AddressAPIError("down"), aiohttp.ClientConnectionError(), asyncio.TimeoutError()):
+            with patch("custom_components.vigieau.__init__.get_insee_code_fromcoord", AsyncMock(side_effect=error)):
+                asyncio.run(coordinator.async_load_location())
+            self.assertEqual(coordinator.location()["INSEE"], "38185")
+        geocode = AsyncMock(return_value=("38421", "Saint-Martin-d'Hères", 45.1842, 5.7224))
+        with patch("custom_components.vigieau.__init__.get_insee_code_fromcoord", geocode):
+            asyncio.run(coordinator.update_method())
+            asyncio.run(coordinator.update_method())
+        geocode.assert_called_once()
+        self.assertEqual(coordinator.location()["INSEE"], "38421")
+
+
+# contour of Grenoble, roughly
+GRENOBLE_AREA = {"rings": [[[5.68, 45.15], [5.76, 45.15], [5.76, 45.21], [5.68, 45.21], [5.68, 45.15]]]}
+
+
+def _tracker_state(lat, lon):
+    state = MagicMock()
+    state.attributes = {"latitude": lat, "longitude": lon}
+    return state
+
+
+@patch("custom_components.vigieau.__init__.async_get_clientsession", MagicMock())
+@patch("custom_components.vigieau.__init__.VigieauAPI", FakeVigieauAPI)
+class TestTracker(unittest.TestCase):
+    def setUp(self):
+        FakeVigieauAPI.responses = {"particulier": _restrictions("alerte", 2, [])}
+        FakeVigieauAPI.not_modified = False
+        self.insee_api = MagicMock()
+        self.insee_api.return_value.get_contour = AsyncMock(
+            return_value={"type": "Polygon", "coordinates": [[[5.74, 45.14], [5.80, 45.14], [5.80, 45.19], [5.74, 45.14]]]})
+        p = patch("custom_components.vigieau.__init__.InseeAPI", self.insee_api)
+        p.start()
+        self.addCleanup(p.stop)
+        self.coordinator = _coordinator(["particulier"], location={**LOCATION, COMMUNE_AREA_KEY: GRENOBLE_AREA})
+        self.coordinator.config["tracker_entity_id"] = "person.someone"
+        self.coordinator.hass.states.get.return_value = _tracker_state(45.18, 5.72)
+        self.coordinator.async_refresh = AsyncMock()
+        asyncio.run(self.coordinator.async_load_location())
+
+    def _move(self, geocode, state):
+        event = MagicMock()
+        event.data = {"new_state": state}
+        with patch("custom_components.vigieau.__init__.get_insee_code_fromcoord", geocode):
+            asyncio.run(self.coordinator.async_tracker_moved(event))
+
+    def test_moves_inside_commune_not_geocoded(self):
+        geocode = AsyncMock()
+        self._move(geocode, _tracker_state(45.19, 5.70))
+        geocode.assert_not_called()
+        self.coordinator.async_refresh.assert_not_called()
+        self.insee_api.return_value.get_contour.assert_not_called()
+
+    def test_leaving_commune(self):
+        geocode = AsyncMock(return_value=("38421", "Saint-Martin-d'Hères", 45.17, 5.77))
+        self._move(geocode, _tracker_state(45.17, 5.77))
+        geocode.assert_called_once()
+        self.coordinator.async_refresh.assert_called_once()
+        self.insee_api.return_value.get_contour.assert_called_once_with("38421")
+        saved = _saved_location(self.coordinator)
+        self.assertEqual(saved["INSEE"], "38421")
+        self.assertEqual(saved[COMMUNE_AREA_KEY]["rings"][0][0], [5.74, 45.14])
+        # new contour is used for later moves
+        geocode.reset_mock()
+        self._move(geocode, _tracker_state(45.16, 5.78))
+        geocode.assert_not_called()
+
+    def test_geocoded_in_same_commune(self):
+        geocode = AsyncMock(return_value=("38185", "Grenoble", 45.22, 5.70))
+        self._move(geocode, _tracker_state(45.22, 5.70))
+        self.coordinator.async_refresh.assert_not_called()
+        self.assertEqual(self.coordinator.location()["latitude"], 45.0)
+
+    def test_geocoding_errors_ignored(self):
+        for error in (AddressAPIError("down"), aiohttp.ClientConnectionError(), asyncio.TimeoutError()):
+            self._move(AsyncMock(side_effect=error), _tracker_state(45.17, 5.77))
+        self.coordinator.async_refresh.assert_not_called()
+        self.assertEqual(self.coordinator.location()["INSEE"], "38185")
+
+    def test_state_without_coordinates_ignored(self):
+        geocode = AsyncMock()
+        state = MagicMock()
+        state.attributes = {}
+        self._move(geocode, state)
+        self._move(geocode, None)
+        geocode.assert_not_called()
+        self.coordinator.async_refresh.assert_not_called()
+
+    def test_missing_contour_fetched_on_load(self):
+        coordinator = _coordinator(["particulier"])
+        coordinator.config["tracker_entity_id"] = "person.someone"
+        coordinator.hass.states.get.return_value = None
+        asyncio.run(coordinator.async_load_location())
+        self.insee_api.return_value.get_contour.assert_called_once_with("38185")
+        self.assertIn(COMMUNE_AREA_KEY, _saved_location(coordinator))
+
+
+class TestRefreshSchedule(unittest.TestCase):
+    def test_phase_is_deterministic(self):
+        self.assertEqual(refresh_phase("entry"), refresh_phase("entry"))
+        self.assertNotEqual(refresh_phase("entry"), refresh_phase("other entry"))
+        self.assertTrue(0 <= refresh_phase("entry") < 1)
+
+    def test_phases_are_spread(self):
+        phases = [refresh_phase(f"entry-{i}") for i in range(100)]
+        # each quarter of the interval gets some entries
+        self.assertEqual({int(phase * 4) for phase in phases}, {0, 1, 2, 3})
+
+    def test_refresh_aligned_on_slot(self):
+        coordinator = _coordinator(["particulier"])
+        coordinator.refresh_phase = 0.5
+        self.assertEqual(coordinator.next_refresh_delay(0), 1800)
+        self.assertEqual(coordinator.next_refresh_delay(3600 * 24 + 600), 1200)
+
+    def test_refresh_too_close_skips_to_next_slot(self):
+        coordinator = _coordinator(["particulier"])
+        coordinator.refresh_phase = 0.5
+        self.assertEqual(coordinator.next_refresh_delay(1700), 3700)
+
+
+class TestMergeRestrictions(unittest.TestCase):
+    def test_single_profile_untouched(self):
+        data = _restrictions("alerte", 2, [GARDEN])
+        self.assertIs(merge_restrictions([data]), data)
+
+    def test_most_severe_level_kept(self):
+        merged = merge_restrictions([
+            _restrictions("vigilance", 1, [POOL]),
+            _restrictions("alerte_renforcee", 3, [POOL, GARDEN]),
+        ])
+        self.assertEqual(merged["niveauGravite"], "alerte_renforcee")
+        self.assertEqual(merged["usages"], [POOL, GARDEN])
+
+    def test_zone_types_kept_apart(self):
+        surface = {**_restrictions("alerte", 2, [{**GARDEN, "description": "Interdit"}]), "arrete": {"cheminFichier": "sup.pdf"}}
+        drinking = {**_restrictions("crise", 4, [{**GARDEN, "description": "Interdit de 8h à 20h"}]), "arrete": {"cheminFichier": "aep.pdf"}}
+        merged = merge_restrictions([surface, surface, drinking], ["SUP", "SUP", "AEP"])
+        self.assertEqual(merged["arrete"]["cheminFichier"], "aep.pdf")
+        self.assertEqual(len(merged["usages"]), 2)
+        by_zone_type = {u["_zone_type"]: u for u in merged["usages"]}
+        self.assertEqual(by_zone_type["SUP"]["_arrete"]["cheminFichier"], "sup.pdf")
+        self.assertEqual(by_zone_type["AEP"]["description"], "Interdit de 8h à 20h")
+        self.assertEqual(usage_label(by_zone_type["SUP"]), f"{GARDEN['nom']} (SUP)")
+        self.assertEqual(usage_label(GARDEN), GARDEN["nom"])
+
+
+class TestMigration(unittest.TestCase):
+    def setUp(self):
+        self.hass = MagicMock()
+        self.hass.config.latitude = 45.1842
+        self.hass.config.longitude = 5.7224
+
+        def update_entry(entry, data, version):
+            entry.data = data
+            entry.version = version
+
+        self.hass.config_entries.async_update_entry.side_effect = update_entry
+        self.store = MagicMock()
+        self.store.async_load = AsyncMock(return_value=None)
+        self.address_api = MagicMock()
+        self.geocode = self.address_api.return_value.get_data = AsyncMock(
+            return_value=("38185", "Grenoble", 45.1842, 5.7224))
+        self.commune_index = AsyncMock()
+        patches = [
+            patch("custom_components.vigieau.__init__.location_store", return_value=self.store),
+            patch("custom_components.vigieau.__init__.AddressAPI", self.address_api),
+            patch("custom_components.vigieau.__init__.async_get_clientsession", MagicMock()),
+            patch("custom_components.vigieau.config_flow.async_get_commune_index", self.commune_index),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def _migrate(self, version, data):
+        entry = MagicMock()
+        entry.version = version
+        entry.data = data
+        self.assertTrue(asyncio.run(async_migrate_entry(self.hass, entry)))
+        self.assertEqual(entry.version, 9)
+        return entry.data
+
+    def test_from_version_2_without_network(self):
+        data = self._migrate(2, {"INSEE": "38185", "city": "Grenoble", "location_mode": "ha_coord", "device_id": "Vigieau"})
+        self.geocode.assert_not_called()
+        self.assertEqual((data["latitude"], data["longitude"]), (45.1842, 5.7224))
+        self.assertEqual(data["zone_types"], ["SUP"])
+        self.assertEqual(data["profiles"], ["particulier"])
+
+    def test_from_version_1_reuses_stored_location(self):
+        self.store.async_load.return_value = {**LOCATION}
+        data = self._migrate(1, {})
+        self.geocode.assert_not_called()
+        self.assertEqual((data["INSEE"], data["latitude"]), ("38185", 45.0))
+
+    def test_from_version_2_uses_ha_coordinates(self):
+        self.store.async_load.return_value = {**LOCATION}
+        data = self._migrate(2, {"INSEE": "38185", "city": "Grenoble", "location_mode": "ha_coord", "device_id": "Vigieau"})
+        self.assertEqual((data["latitude"], data["longitude"]), (45.1842, 5.7224))
+
+    def test_from_version_1_geocodes_once(self):
+        data = self._migrate(1, {})
+        self.geocode.assert_called_once_with(45.1842, 5.7224)
+        self.commune_index.assert_not_called()
+        self.assertEqual(data["city"], "Grenoble")
+        self.assertTrue(data["follow_ha_coords"])
+
+
+class TestDiagnostics(unittest.TestCase):
+    def test_parsing_cache_counters(self):
+        coordinator = _coordinator(["particulier"])
+        hass = MagicMock()
+        hass.data = {"vigieau": {"entry": {"vigieau_coordinator": coordinator}}}
+        entry = MagicMock(entry_id="entry")
+        cached_classify_restrictions(("Interdiction",))
+        cached_classify_restrictions(("Interdiction",))
+        diagnostics = asyncio.run(async_get_config_entry_diagnostics(hass, entry))
+        caches = diagnostics["parsing_caches"]
+        self.assertGreaterEqual(caches["classify_restrictions"]["hits"], 1)
+        self.assertIn("misses", caches["extract_time_range"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+from os import path
+import json
+import sys
+import unittest
+from unittest.mock import patch
+
+current_dir = path.dirname(__file__)
+parent_dir = path.dirname(current_dir)
+sys.path.append(".")
+sys.path.append(parent_dir)
+
+from custom_components.vigieau.const import SENSOR_DEFINITIONS, usage_match_texts
+from custom_components.vigieau.matching import (
+    LiteralAutomaton,
+    SENSOR_MATCHER,
+    required_literal,
+)
+
+
+class TestRequiredLiteral(unittest.TestCase):
+    def test_longest_top_level_literal(self):
+        self.assertEqual(required_literal(".*jeux d'eau.*"), "jeux d'eau")
+        self.assertEqual(
+            required_literal("Surfaces accueillant des manifestations temporaires.+sportives et culturelles.*Arroser"),
+            "Surfaces accueillant des manifestations temporaires",
+        )
+
+    def test_escaped_characters_are_literals(self):
+        self.assertEqual(required_literal(r"\(goutte à gouttes\)"), "(goutte à gouttes)")
+
+    def test_branch_common_prefix(self):
+        self.assertEqual(required_literal("voiries|voieries"), "voi")
+
+    def test_optional_parts_are_not_required(self):
+        self.assertEqual(required_literal("ab?"), "a")
+        self.assertIsNone(required_literal("(foo|bar)"))
+        self.assertIsNone(required_literal("(?i)fontaines"))
+
+
+class TestLiteralAutomaton(unittest.TestCase):
+    def test_find_overlapping_literals(self):
+        automaton = LiteralAutomaton(["he", "she", "his", "hers"])
+        self.assertEqual(automaton.find("ushers"), {"he", "she", "hers"})
+        self.assertEqual(automaton.find("nothing"), set())
+
+    def test_empty_automaton(self):
+        self.assertEqual(LiteralAutomaton([]).find("fontaines"), set())
+
+
+class TestSensorMatcher(unittest.TestCase):
+    def test_prefilter_agrees_with_matchers(self):
+        """With no lookup table, prefiltered matching must give the same sensors as evaluating every matcher."""
+        file = path.join(parent_dir, "scripts/full_usage_list.json")
+        with open(file) as f:
+            data = json.loads(f.read())
+        usages = [{"nom": r["usage"], "thematique": r["thematique"]} for r in data["restrictions"]]
+        usages.append({"nom": "Arrosage des plants destinés à l'alimentation (hors usage agricole)", "thematique": "Arroser"})
+
+        with patch("custom_components.vigieau.matching.usage_lookup", return_value={}):
+            for usage in usages:
+                texts = usage_match_texts(usage)
+                expected = [s.key for s in SENSOR_DEFINITIONS if s.match_patterns(texts)]
+                self.assertEqual(list(SENSOR_MATCHER.sensor_keys(texts)), expected, usage["nom"])
+
+    def test_known_usages_use_lookup_table(self):
+        texts = usage_match_texts({"nom": "Arrosage des jardins potagers", "thematique": "Arroser"})
+        with patch("custom_components.vigieau.matching.usage_lookup", return_value={texts[1]: frozenset(["pool"])}):
+            self.assertEqual(set(SENSOR_MATCHER.sensor_keys(texts)), {"pool"})
+
+
+if __name__ == "__main__":
+    unittest.main()
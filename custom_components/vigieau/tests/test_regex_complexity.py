@@ -0,0 +1,114 @@
+"""Guard against matchers with super-linear backtracking.
+
+Matchers run on decree text we don't control, inside the Home Assistant event loop.
+Each matcher is timed on adversarial texts of growing length:
+  - filler only, which none of the matcher literals appear in
+  - "near misses": every literal fragment of the matcher separated by long filler, except the last one,
+    so that the engine makes as much progress as possible before failing
+Running time must grow linearly with the text length.
+"""
+from os import path
+import sys
+import time
+import unittest
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:  # python < 3.11
+    import sre_constants
+    import sre_parse
+
+current_dir = path.dirname(__file__)
+parent_dir = path.dirname(current_dir)
+sys.path.append(".")
+sys.path.append(parent_dir)
+
+from custom_components.vigieau.const import SENSOR_DEFINITIONS, _compile_matchers, _trim_wildcards
+
+# growing sizes, so that a backtracking matcher fails before reaching a length it would stall on
+SIZES = (500, 2_000, 8_000)
+GROWTH = 4
+# linear growth would give a ratio of GROWTH between consecutive sizes, leave room for timing noise
+MAX_GROWTH = 3 * GROWTH
+# timings under this are too small to be meaningful (seconds)
+NOISE_FLOOR = 0.002
+REPEAT = 3
+
+
+def _literal_fragments(matcher: str) -> list[str]:
+    fragments = []
+    current = ""
+    for op, arg in sre_parse.parse(matcher):
+        if op is sre_constants.LITERAL:
+            current += chr(arg)
+        elif current:
+            fragments.append(current)
+            current = ""
+    if current:
+        fragments.append(current)
+    return fragments
+
+
+def _adversarial_texts(matcher: str, size: int) -> list[str]:
+    fragments = _literal_fragments(matcher)
+    filler = "x" * size
+    texts = [filler]
+    if len(fragments) > 1:
+        texts.append(filler + filler.join(fragments[:-1]) + filler)
+    return texts
+
+
+def _search_time(pattern, text: str) -> float:
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        pattern.search(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class TestRegexComplexity(unittest.TestCase):
+    def assertLinear(self, pattern, texts_for_size, msg):
+        previous_size, previous_times = None, None
+        for size in SIZES:
+            texts = texts_for_size(size)
+            times = [_search_time(pattern, text) for text in texts]
+            if previous_times is not None:
+                for previous_time, current_time in zip(previous_times, times):
+                    self.assertLess(
+                        current_time,
+                        max(MAX_GROWTH * previous_time, NOISE_FLOOR),
+                        f"{msg}: {previous_time * 1000:.2f}ms with {previous_size} chars of filler but {current_time * 1000:.2f}ms with {size}",
+                    )
+            previous_size, previous_times = size, times
+
+    def test_matchers_run_in_linear_time(self):
+        for sensor in SENSOR_DEFINITIONS:
+            for matcher in sensor.matchers:
+                with self.subTest(sensor=sensor.key, matcher=matcher):
+                    self.assertLinear(
+                        _compile_matchers([matcher]),
+                        lambda size: _adversarial_texts(matcher, size),
+                        f"Matcher **{matcher}** of sensor {sensor.key} backtracks super-linearly",
+                    )
+
+    def test_guard_detects_backtracking(self):
+        """Sanity check of the benchmark itself on a matcher known to backtrack."""
+        with self.assertRaises(AssertionError):
+            self.assertLinear(
+                _compile_matchers(["a.*.*b"]),
+                lambda size: ["a" + "x" * size],
+                "expected",
+            )
+
+    def test_trim_wildcards(self):
+        self.assertEqual(_trim_wildcards(".*jeux d'eau.*"), "jeux d'eau")
+        self.assertEqual(_trim_wildcards(".*?fontaines"), "fontaines")
+        self.assertEqual(_trim_wildcards(".*+x"), ".*+x")
+        self.assertEqual(_trim_wildcards(r"fin\.*"), r"fin\.*")
+        self.assertEqual(_trim_wildcards(r"fin\\.*"), "fin\\\\")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,7 +5,13 @@ current_dir = path.dirname(__file__)
 parent_dir = path.dirname(current_dir)
 sys.path.append(".")
 sys.path.append(parent_dir)
-from custom_components.vigieau.const import SENSOR_DEFINITIONS
+from custom_components.vigieau.const import (
+    SENSOR_DEFINITIONS,
+    USAGE_LOOKUP_FILE,
+    load_usage_lookup,
+    usage_lookup,
+    usage_match_texts,
+)
 import unittest
 import json
 import os
@@ -134,6 +140,92 @@ class TestRegexp(unittest.TestCase):
             "Usage 'plants destinés à l\\'alimentation (hors usage agricole)' should match potagers",
         )
 
+    def test_compiled_matchers_agree_with_individual_matchers(self):
+        """Compiled sensor patterns must give the same result as evaluating each matcher on its own."""
+
+        def legacy_match(sensor, usage):
+            for matcher in sensor.matchers:
+                nom = usage["nom"]
+                if "hors" not in matcher.lower():
+                    nom = re.sub(r"\(hors[^)]*\)", "", nom)
+                if re.search(matcher, nom + "|" + usage["thematique"]):
+                    return True
+            return False
+
+        file = os.path.join(parent_dir, "scripts/full_usage_list.json")
+        with open(file) as f:
+            data = json.loads(f.read())
+
+        usages = [
+            {"nom": r["usage"], "thematique": r["thematique"]} for r in data["restrictions"]
+        ]
+        usages.append(
+            {
+                "nom": "Arrosage des espaces verts (hors pelouses, fleurs et massifs fleuris ainsi que jardins potagers)",
+                "thematique": "Arroser",
+            }
+        )
+        for usage in usages:
+            for sensor in SENSOR_DEFINITIONS:
+                self.assertEqual(
+                    sensor.match(usage),
+                    legacy_match(sensor, usage),
+                    f"Sensor {sensor.key} disagrees on **{usage['nom']}**",
+                )
+
+    def test_sort_usages_by_sensor(self):
+        """Usages are bucketed under every sensor they match, unknown ones are reported apart."""
+        from custom_components.vigieau.__init__ import sort_usages_by_sensor
+
+        potagers = {"nom": "Arrosage des jardins potagers", "thematique": "Arroser"}
+        unknown = {"nom": "Usage imaginaire", "thematique": "Inconnue"}
+        usages_by_sensor, unknown_usages = sort_usages_by_sensor([potagers, unknown])
+
+        self.assertEqual(set(usages_by_sensor), {s.key for s in SENSOR_DEFINITIONS})
+        self.assertIn(potagers, usages_by_sensor["potagers"])
+        for sensor in SENSOR_DEFINITIONS:
+            self.assertEqual(potagers in usages_by_sensor[sensor.key], sensor.match(potagers))
+        self.assertEqual(unknown_usages, [unknown])
+
+    def test_usage_lookup_is_up_to_date(self):
+        """The shipped lookup table must be regenerated whenever matchers change."""
+        self.assertTrue(
+            usage_lookup(),
+            "usage_lookup.json is missing or outdated, run scripts/generate_usage_lookup.py",
+        )
+        file = os.path.join(parent_dir, "scripts/full_usage_list.json")
+        with open(file) as f:
+            data = json.loads(f.read())
+        for restriction in data["restrictions"]:
+            texts = usage_match_texts({"nom": restriction["usage"], "thematique": restriction["thematique"]})
+            self.assertIn(texts[1], usage_lookup())
+
+    def test_usage_lookup_read_once_on_first_use(self):
+        from unittest.mock import patch
+
+        usage_lookup.cache_clear()
+        self.addCleanup(usage_lookup.cache_clear)
+        with patch("custom_components.vigieau.const.load_usage_lookup", return_value={}) as load:
+            load.assert_not_called()
+            usage_lookup()
+            usage_lookup()
+        load.assert_called_once()
+
+    def test_usage_lookup_ignored_when_outdated(self):
+        """A table generated for other matchers must not be trusted."""
+        import tempfile
+
+        with open(USAGE_LOOKUP_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+        data["fingerprint"] = "outdated"
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(data, f)
+        try:
+            self.assertEqual(load_usage_lookup(f.name), {})
+        finally:
+            os.remove(f.name)
+        self.assertEqual(load_usage_lookup(os.path.join(parent_dir, "missing.json")), {})
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,7 @@
 from os import path
 import sys
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
+import asyncio
 from datetime import time as dt_time, datetime as dt_datetime, timedelta
 
 current_dir = path.dirname(__file__)
@@ -8,7 +9,7 @@ parent_dir = path.dirname(current_dir)
 sys.path.append(".")
 sys.path.append(parent_dir)
 
-from custom_components.vigieau.__init__ import _parse_time_str, UsageRestrictionEntity, UsageRestrictionBinaryEntity, classify_restrictions, extract_time_range
+from custom_components.vigieau.__init__ import _parse_time_str, UsageRestrictionEntity, UsageRestrictionBinaryEntity, classify_restrictions, extract_time_range, cached_classify_restrictions, cached_extract_time_range, DailySchedule, TimeBoundaryScheduler, async_unload_entry, get_time_boundary_scheduler
 import unittest
 
 
@@ -120,6 +121,27 @@ class TestExtractTimeRangeStandalone(unittest.TestCase):
         self.assertEqual(result, (dt_time(8, 0), dt_time(20, 0)))
 
 
+class TestParsingCache(unittest.TestCase):
+    def test_cached_results_match(self):
+        restrictions = ("Interdiction de 8 h à 20 h", "Sensibilisation")
+        self.assertEqual(cached_classify_restrictions(restrictions), classify_restrictions(list(restrictions)))
+        self.assertEqual(cached_extract_time_range(restrictions), extract_time_range(list(restrictions)))
+
+    def test_unchanged_descriptions_hit_cache(self):
+        restrictions = ("Interdit sauf abreuvement des animaux uniquement de 18 h à 10 h",)
+        cached_classify_restrictions(restrictions)
+        cached_extract_time_range(restrictions)
+        classify_info = cached_classify_restrictions.cache_info()
+        time_info = cached_extract_time_range.cache_info()
+
+        cached_classify_restrictions(restrictions)
+        cached_extract_time_range(restrictions)
+        self.assertEqual(cached_classify_restrictions.cache_info().hits, classify_info.hits + 1)
+        self.assertEqual(cached_classify_restrictions.cache_info().misses, classify_info.misses)
+        self.assertEqual(cached_extract_time_range.cache_info().hits, time_info.hits + 1)
+        self.assertEqual(cached_extract_time_range.cache_info().misses, time_info.misses)
+
+
 class TestComputeNativeValue(unittest.TestCase):
     def _make_entity(self, restrictions, time_restrictions=None, attributes=None):
         entity = MagicMock(spec=UsageRestrictionEntity)
@@ -275,6 +297,8 @@ class TestTimeAttributes(unittest.TestCase):
         entity._update_dynamic_attributes = UsageRestrictionEntity._update_dynamic_attributes.__get__(entity, UsageRestrictionEntity)
         entity._native_is_time_based = False
         entity._attr_native_value = None
+        # built on coordinator updates
+        entity._daily_schedule = DailySchedule(entity._get_effective_time_ranges())
         return entity
 
     def test_get_ranges_from_api(self):
@@ -367,15 +391,153 @@ class TestTimeAttributes(unittest.TestCase):
         self.assertIn("next_restriction_end", entity._attr_state_attributes)
 
 
+class TestDailySchedule(unittest.TestCase):
+    NOW = dt_datetime(2026, 7, 6, 14, 30, 0)
+
+    def test_empty(self):
+        schedule = DailySchedule([])
+        self.assertFalse(schedule.is_restricted(dt_time(12, 0)))
+        self.assertIsNone(schedule.next_transition(self.NOW))
+        self.assertIsNone(schedule.next_restriction_start(self.NOW))
+
+    def test_boundaries(self):
+        schedule = DailySchedule([(dt_time(8, 0), dt_time(20, 0))])
+        self.assertFalse(schedule.is_restricted(dt_time(7, 59, 59)))
+        self.assertTrue(schedule.is_restricted(dt_time(8, 0)))
+        self.assertTrue(schedule.is_restricted(dt_time(19, 59, 59)))
+        self.assertFalse(schedule.is_restricted(dt_time(20, 0)))
+
+    def test_overnight(self):
+        schedule = DailySchedule([(dt_time(20, 0), dt_time(8, 0))])
+        self.assertTrue(schedule.is_restricted(dt_time(23, 0)))
+        self.assertTrue(schedule.is_restricted(dt_time(0, 0)))
+        self.assertFalse(schedule.is_restricted(dt_time(12, 0)))
+        self.assertEqual(schedule.next_restriction_start(self.NOW), dt_datetime(2026, 7, 6, 20, 0))
+        self.assertEqual(schedule.next_restriction_end(self.NOW), dt_datetime(2026, 7, 7, 8, 0))
+
+    def test_overlapping_ranges_are_merged(self):
+        schedule = DailySchedule([(dt_time(10, 0), dt_time(14, 0)), (dt_time(8, 0), dt_time(12, 0))])
+        now = dt_datetime(2026, 7, 6, 9, 0, 0)
+        self.assertTrue(schedule.is_restricted(dt_time(13, 0)))
+        # 10h and 12h are not transitions
+        self.assertEqual(schedule.next_transition(now), dt_datetime(2026, 7, 6, 14, 0))
+
+    def test_multiple_ranges_next_transitions(self):
+        schedule = DailySchedule([(dt_time(8, 0), dt_time(10, 0)), (dt_time(18, 0), dt_time(20, 0))])
+        self.assertFalse(schedule.is_restricted(self.NOW.time()))
+        self.assertEqual(schedule.next_restriction_start(self.NOW), dt_datetime(2026, 7, 6, 18, 0))
+        self.assertEqual(schedule.next_restriction_end(self.NOW), dt_datetime(2026, 7, 6, 20, 0))
+        late = dt_datetime(2026, 7, 6, 21, 0, 0)
+        self.assertEqual(schedule.next_restriction_start(late), dt_datetime(2026, 7, 7, 8, 0))
+        self.assertEqual(schedule.next_transition(late), dt_datetime(2026, 7, 7, 8, 0))
+
+    def test_transition_at_now_is_in_the_future(self):
+        schedule = DailySchedule([(dt_time(8, 0), dt_time(20, 0))])
+        self.assertEqual(schedule.next_transition(dt_datetime(2026, 7, 6, 8, 0, 0)), dt_datetime(2026, 7, 6, 20, 0))
+
+    def test_ranges_covering_whole_day(self):
+        schedule = DailySchedule([(dt_time(0, 0), dt_time(12, 0)), (dt_time(12, 0), dt_time(0, 0))])
+        self.assertTrue(schedule.is_restricted(dt_time(3, 0)))
+        self.assertIsNone(schedule.next_transition(self.NOW))
+
+    def test_range_ending_at_midnight(self):
+        schedule = DailySchedule([(dt_time(20, 0), dt_time(0, 0))])
+        self.assertTrue(schedule.is_restricted(dt_time(23, 59)))
+        self.assertFalse(schedule.is_restricted(dt_time(0, 0)))
+        self.assertEqual(schedule.next_restriction_end(self.NOW), dt_datetime(2026, 7, 7, 0, 0))
+
+
+class TestTimeBoundaryScheduler(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('custom_components.vigieau.__init__.async_track_point_in_time')
+        self.track = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.scheduler = TimeBoundaryScheduler(MagicMock())
+
+    def test_single_timer_per_instant(self):
+        at_8 = dt_datetime(2026, 7, 6, 8, 0)
+        first, second = MagicMock(), MagicMock()
+        self.scheduler.async_schedule(at_8, first)
+        self.scheduler.async_schedule(at_8, second)
+        self.assertEqual(self.track.call_count, 1)
+
+        self.scheduler._boundary_reached(at_8)
+        first.assert_called_once_with(at_8)
+        second.assert_called_once_with(at_8)
+
+    def test_earliest_instant_armed(self):
+        at_8, at_20 = dt_datetime(2026, 7, 6, 8, 0), dt_datetime(2026, 7, 6, 20, 0)
+        late, early = MagicMock(), MagicMock()
+        self.scheduler.async_schedule(at_20, late)
+        self.scheduler.async_schedule(at_8, early)
+        self.assertEqual(self.track.call_args[0][2], at_8)
+
+        self.scheduler._boundary_reached(at_8)
+        early.assert_called_once()
+        late.assert_not_called()
+        self.assertEqual(self.track.call_args[0][2], at_20)
+
+    def test_cancelled_action_not_run(self):
+        at_8, at_20 = dt_datetime(2026, 7, 6, 8, 0), dt_datetime(2026, 7, 6, 20, 0)
+        cancelled, kept = MagicMock(), MagicMock()
+        cancel = self.scheduler.async_schedule(at_8, cancelled)
+        self.scheduler.async_schedule(at_20, kept)
+        cancel()
+
+        self.scheduler._boundary_reached(at_20)
+        cancelled.assert_not_called()
+        kept.assert_called_once()
+
+    def test_cancelling_earliest_instant_rearms(self):
+        at_8, at_20 = dt_datetime(2026, 7, 6, 8, 0), dt_datetime(2026, 7, 6, 20, 0)
+        cancel = self.scheduler.async_schedule(at_8, MagicMock())
+        self.scheduler.async_schedule(at_20, MagicMock())
+        unsub_at_8 = self.track.return_value
+        self.track.return_value = MagicMock()
+        cancel()
+        unsub_at_8.assert_called_once()
+        self.assertEqual(self.track.call_args[0][2], at_20)
+
+    def test_cancelling_last_action_disarms(self):
+        at_8 = dt_datetime(2026, 7, 6, 8, 0)
+        self.scheduler.async_schedule(at_8, MagicMock())()
+        self.track.return_value.assert_called_once()
+        self.assertEqual(self.scheduler._instants, [])
+
+    def test_dropped_with_last_entry(self):
+        entries = [MagicMock(entry_id="first"), MagicMock(entry_id="second")]
+        hass = MagicMock()
+        hass.data = {"vigieau": {"first": {}, "second": {}}}
+        hass.config_entries.async_entries.return_value = entries
+        hass.config_entries.async_unload_platforms = AsyncMock(return_value=True)
+        scheduler = get_time_boundary_scheduler(hass)
+        scheduler.async_schedule(dt_datetime(2026, 7, 6, 8, 0), MagicMock())
+
+        asyncio.run(async_unload_entry(hass, entries[0]))
+        self.assertIs(get_time_boundary_scheduler(hass), scheduler)
+        asyncio.run(async_unload_entry(hass, entries[1]))
+        self.assertNotIn(scheduler, hass.data["vigieau"].values())
+        self.track.return_value.assert_called_once()
+
+    def test_action_rescheduling_itself(self):
+        at_8, at_20 = dt_datetime(2026, 7, 6, 8, 0), dt_datetime(2026, 7, 6, 20, 0)
+        action = MagicMock(side_effect=lambda now: self.scheduler.async_schedule(at_20, action))
+        self.scheduler.async_schedule(at_8, action)
+        self.scheduler._boundary_reached(at_8)
+        self.assertEqual(self.track.call_count, 2)
+        self.assertEqual(self.track.call_args[0][2], at_20)
+
+
 class TestHandleCoordinatorUpdate(unittest.TestCase):
     def _make_entity_with_coordinator(self, usages):
         from custom_components.vigieau.__init__ import RestrictionMixin
         entity = MagicMock(spec=UsageRestrictionEntity)
         entity.coordinator = MagicMock()
         entity.coordinator.last_update_success = True
-        entity.coordinator.data = {"usages": usages}
+        entity.coordinator.data = {"usages": usages, "_usages_by_sensor": {"test": usages}}
         entity._config = MagicMock()
-        entity._config.match.return_value = True
+        entity._config.key = "test"
+        entity._config_entry = MagicMock()
         entity._restrictions = []
         entity._time_restrictions = {}
         entity._extracted_time_range = None